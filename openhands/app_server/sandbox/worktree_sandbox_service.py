@@ -1,21 +1,28 @@
 """Worktree-based sandbox service for OpenHands V1.
 
-import logging
-
 This service creates sandboxes using WorktreeRuntime instead of the agent server,
 providing git worktree isolation without requiring a separate agent server process.
 This allows V1 conversations to work on Windows without fcntl dependency.
 """
 
 import asyncio
+import contextlib
+import logging
 import os
+import select
+import shutil
+import signal
+import socket
 import subprocess
-import time
-from dataclasses import dataclass
+import sys
+import threading
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, AsyncIterable
 
+import base62
 import httpx
+import psutil
 from fastapi import Request
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -38,9 +45,41 @@ from openhands.app_server.services.injector import InjectorState
 
 _logger = logging.getLogger(__name__)
 
+# Readiness polling against the local action execution server (seconds)
+_READY_POLL_INITIAL_INTERVAL = 0.025
+_READY_POLL_MAX_INTERVAL = 0.25
+_READY_POLL_REQUEST_TIMEOUT = 0.5
+
+# Kernel port assignments to try before giving up on finding an unreserved one
+_MAX_PORT_ATTEMPTS = 16
+
+# How much of the end of a server log to include when reporting a failed start
+_LOG_TAIL_SIZE = 8 * 1024
+
+# Upper bound on servers spawned at once by start_sandboxes
+_MAX_CONCURRENT_STARTS = (os.cpu_count() or 1) * 2
+
+# Chunk size for streaming file reads and writes
+_FILE_CHUNK_SIZE = 64 * 1024
+
+
+async def _stream_file(
+    file_path: str, chunk_size: int = _FILE_CHUNK_SIZE
+) -> AsyncGenerator[bytes, None]:
+    """Read a file in fixed-size chunks without blocking the event loop."""
+    f = await asyncio.to_thread(open, file_path, 'rb')
+    try:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
 
 class WorktreeInfo(BaseModel):
-    """Information about a running worktree sandbox."""
+    """Information about a running worktree sandbox.
+
+    ``ready`` is set once the server has answered its first readiness probe.
+    """
 
     pid: int
     port: int
@@ -49,75 +88,174 @@ class WorktreeInfo(BaseModel):
     session_api_key: str
     created_at: datetime
     sandbox_spec_id: str
+    ready: bool = False
 
     model_config = ConfigDict(frozen=True)
 
 
 # Global store
 _worktrees: dict[str, WorktreeInfo] = {}
-
-
-@dataclass
+# Reverse index of session API key -> sandbox ID, kept in sync with _worktrees
+_worktrees_by_api_key: dict[str, str] = {}
+# psutil handles for running sandboxes, so status checks don't reopen /proc/<pid>
+_process_cache: dict[str, psutil.Process] = {}
+# Ports handed to sandboxes that are starting or running. Reserved without an
+# intervening await, so concurrent starts on the event loop never share a port
+# even if the kernel offers it again before the first server has bound it.
+_reserved_ports: set[int] = set()
+# Serializes first-time initialization of base repositories across threads
+_base_repo_lock = threading.Lock()
+# Base repositories already known to have a commit to check worktrees out from
+_ready_base_repos: set[str] = set()
+
+
+@dataclass(slots=True)
 class WorktreeSandboxService(SandboxService):
     """Sandbox service that uses WorktreeRuntime for isolation.
     
     This is an alternative to ProcessSandboxService that doesn't require
     the agent server (which needs fcntl on Unix). It runs the action
     execution server directly in a git worktree.
+
+    ``httpx_client`` is used for the rapid readiness probes against each new
+    server, so it must keep connections alive between requests (httpx's default
+    pool does) or every probe pays a fresh TCP handshake.
     """
 
     user_id: str | None
     sandbox_spec_service: SandboxSpecService
     base_working_dir: str
+    base_repo_path: str
     base_port: int
     python_executable: str
     httpx_client: httpx.AsyncClient
+    _base_env: dict[str, str] = field(init=False, repr=False)
 
     def __post_init__(self):
         """Initialize the service after dataclass creation."""
         os.makedirs(self.base_working_dir, exist_ok=True)
-
-    def _find_unused_port(self) -> int:
-        """Find an unused port starting from base_port."""
-        import socket
-        
-        port = self.base_port
-        while port < self.base_port + 10000:
+        # Snapshot os.environ once; each start only layers its own keys on top
+        self._base_env = dict(os.environ)
+
+    def _reserve_port(self) -> socket.socket:
+        """Bind a socket to a kernel-assigned ephemeral port and keep it open.
+
+        The socket has SO_REUSEADDR set and is never listened on, so on Linux
+        the server can still bind and listen on the port. While the socket stays
+        open the kernel won't offer the port to anyone else, which closes the
+        window between choosing the port and the server binding it. The caller
+        closes the socket once the server is up.
+
+        Other platforms don't allow that second bind (macOS) or let it steal the
+        port outright (Windows), so there the caller closes the socket before
+        spawning the server and relies on ``_reserved_ports`` alone.
+        """
+        for _ in range(_MAX_PORT_ATTEMPTS):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.bind(('', port))
-                    return port
-            except OSError:
-                port += 1
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.bind(('', 0))
+            except OSError as e:
+                s.close()
+                raise SandboxError(f'No available ports found: {e}')
+            if s.getsockname()[1] not in _reserved_ports:
+                return s
+            s.close()
         raise SandboxError('No available ports found')
 
-    def _create_worktree_directory(self, sandbox_id: str) -> str:
-        """Create a dedicated directory for the worktree."""
+    async def _create_worktree_directory(self, sandbox_id: str) -> str:
+        """Create a dedicated directory for the worktree off the event loop."""
+        return await asyncio.to_thread(self._create_worktree_directory_sync, sandbox_id)
+
+    def _ensure_base_repository(self) -> None:
+        """Initialize the base repository that sandboxes are checked out from.
+
+        `git worktree add` needs a commit to check out, so a repository left
+        without one by an interrupted initialization is repaired as well.
+        """
+        with _base_repo_lock:
+            if self.base_repo_path in _ready_base_repos:
+                return
+            if not self._has_head():
+                try:
+                    self._init_base_repository()
+                except subprocess.CalledProcessError as e:
+                    raise SandboxError(
+                        f'Failed to initialize base repository '
+                        f'{self.base_repo_path}: {e.stderr.decode()}'
+                    )
+                except OSError as e:
+                    raise SandboxError(
+                        f'Failed to initialize base repository '
+                        f'{self.base_repo_path}: {e}'
+                    )
+            _ready_base_repos.add(self.base_repo_path)
+
+    def _has_head(self) -> bool:
+        """Check whether the base repository exists and has a commit."""
+        # Only ask git once there is a .git here, so that a repository further
+        # up the tree is never mistaken for the base repository
+        if not os.path.exists(os.path.join(self.base_repo_path, '.git')):
+            return False
+        result = subprocess.run(
+            ['git', 'rev-parse', '--verify', '-q', 'HEAD'],
+            cwd=self.base_repo_path,
+            capture_output=True,
+            check=False,
+        )
+        return result.returncode == 0
+
+    def _init_base_repository(self) -> None:
+        """Create the base repository and its initial commit.
+
+        Every step is safe to repeat over a half-initialized repository.
+        """
+        os.makedirs(self.base_repo_path, exist_ok=True)
+        subprocess.run(
+            ['git', 'init', '-q'],
+            cwd=self.base_repo_path,
+            capture_output=True,
+            check=True,
+        )
+        # Worktrees share this config, so the identity is written once here
+        # rather than with `git config` in every sandbox
+        with open(os.path.join(self.base_repo_path, '.git', 'config'), 'a+') as f:
+            f.seek(0)
+            if '[user]' not in f.read():
+                f.write('[user]\n\temail = openhands@localhost\n\tname = OpenHands\n')
+        subprocess.run(
+            ['git', 'commit', '-q', '--allow-empty', '-m', 'Initial commit'],
+            cwd=self.base_repo_path,
+            capture_output=True,
+            check=True,
+        )
+
+    def _create_worktree_directory_sync(self, sandbox_id: str) -> str:
+        """Create a git worktree for the sandbox from the base repository."""
         worktree_dir = os.path.join(self.base_working_dir, sandbox_id)
-        os.makedirs(worktree_dir, exist_ok=True)
-        
-        # Initialize git repo if not exists
-        git_dir = os.path.join(worktree_dir, '.git')
-        if not os.path.exists(git_dir):
-            subprocess.run(
-                ['git', 'init'],
-                cwd=worktree_dir,
-                capture_output=True,
-                check=False,
-            )
+        if os.path.exists(os.path.join(worktree_dir, '.git')):
+            return worktree_dir
+
+        try:
+            self._ensure_base_repository()
             subprocess.run(
-                ['git', 'config', 'user.email', 'openhands@localhost'],
-                cwd=worktree_dir,
+                [
+                    'git',
+                    '-C',
+                    self.base_repo_path,
+                    'worktree',
+                    'add',
+                    '--detach',
+                    worktree_dir,
+                ],
                 capture_output=True,
-                check=False,
+                check=True,
             )
-            subprocess.run(
-                ['git', 'config', 'user.name', 'OpenHands'],
-                cwd=worktree_dir,
-                capture_output=True,
-                check=False,
+        except subprocess.CalledProcessError as e:
+            raise SandboxError(
+                f'Failed to create worktree for {sandbox_id}: {e.stderr.decode()}'
             )
-        
+
         return worktree_dir
 
     async def _start_worktree_process(
@@ -127,17 +265,19 @@ class WorktreeSandboxService(SandboxService):
         worktree_path: str,
         session_api_key: str,
         sandbox_spec: SandboxSpecInfo,
-    ) -> subprocess.Popen:
+    ) -> asyncio.subprocess.Process:
         """Start the action execution server in the worktree."""
         
         # Prepare environment
-        env = os.environ.copy()
-        env.update(sandbox_spec.initial_env)
-        env['SESSION_API_KEY'] = session_api_key
-        env['RUNTIME'] = 'worktree'
-        env['OPENHANDS_WORKTREE_PATH'] = worktree_path
-        env['port'] = str(port)
-        env['PYTHONUNBUFFERED'] = '1'
+        env = {
+            **self._base_env,
+            **sandbox_spec.initial_env,
+            'SESSION_API_KEY': session_api_key,
+            'RUNTIME': 'worktree',
+            'OPENHANDS_WORKTREE_PATH': worktree_path,
+            'port': str(port),
+            'PYTHONUNBUFFERED': '1',
+        }
 
         # Start action execution server directly
         cmd = [
@@ -153,119 +293,217 @@ class WorktreeSandboxService(SandboxService):
         )
 
         try:
-            process = subprocess.Popen(
-                cmd,
-                env=env,
-                cwd=worktree_path,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+            # Server output goes to a log file rather than pipes nobody drains,
+            # which would block the server once the pipe buffer filled up. The
+            # child keeps its own copy of the descriptor.
+            log_file = await asyncio.to_thread(
+                open, self._get_log_path(sandbox_id), 'wb', buffering=0
             )
+            try:
+                return await asyncio.create_subprocess_exec(
+                    *cmd,
+                    env=env,
+                    cwd=worktree_path,
+                    stdout=log_file,
+                    stderr=asyncio.subprocess.STDOUT,
+                )
+            finally:
+                log_file.close()
+        except Exception as e:
+            raise SandboxError(f'Failed to start worktree process: {e}')
+
+    def _get_log_path(self, sandbox_id: str) -> str:
+        """Get the path of the server log for a sandbox.
+
+        Kept next to the worktree rather than inside it so it never shows up as
+        an untracked file in the sandbox's git status.
+        """
+        return os.path.join(self.base_working_dir, f'{sandbox_id}.log')
 
-            await asyncio.sleep(2)
+    def _read_log_tail(self, sandbox_id: str) -> bytes:
+        """Read the end of a sandbox's server log, for error reporting."""
+        try:
+            with open(self._get_log_path(sandbox_id), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(f.tell() - _LOG_TAIL_SIZE, 0))
+                return f.read()
+        except OSError:
+            return b''
+
+    async def _watch_child_exit(self, process: asyncio.subprocess.Process) -> int:
+        """Wait for the worktree process to exit and return its exit code."""
+        return await process.wait()
+
+    async def _wait_for_worktree_ready(
+        self, sandbox_id: str, process: asyncio.subprocess.Process, port: int
+    ) -> None:
+        """Wait until the server answers or the process exits, whichever is first."""
+        ready_task = asyncio.create_task(self._wait_for_server_ready(port))
+        exit_task = asyncio.create_task(self._watch_child_exit(process))
+        try:
+            await asyncio.wait(
+                {ready_task, exit_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            ready_task.cancel()
+            exit_task.cancel()
 
-            if process.poll() is not None:
-                stdout, stderr = process.communicate()
-                raise SandboxError(f'Worktree process failed: {stderr.decode()}')
+        if ready_task.done() and not ready_task.cancelled() and ready_task.result():
+            return
 
-            return process
+        if exit_task.done() and not exit_task.cancelled():
+            output = await asyncio.to_thread(self._read_log_tail, sandbox_id)
+            await self.delete_sandbox(sandbox_id)
+            raise SandboxError(f'Worktree process failed: {output.decode()}')
 
-        except Exception as e:
-            raise SandboxError(f'Failed to start worktree process: {e}')
+        await self.delete_sandbox(sandbox_id)
+        raise SandboxError('Worktree sandbox failed to start')
 
     async def _wait_for_server_ready(self, port: int, timeout: int = 30) -> bool:
-        """Wait for the action execution server to be ready."""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                response = await self.httpx_client.get(
-                    f'http://localhost:{port}/alive',
-                    timeout=2.0
-                )
-                if response.status_code == 200:
-                    return True
-            except Exception:
-                pass
-            await asyncio.sleep(1)
-        return False
+        """Wait for the action execution server to be ready.
 
-    async def list_sandboxes(
-        self, page_id: str | None = None
+        The server is on localhost, so poll quickly at first and back off
+        exponentially up to a small cap rather than sleeping a fixed second.
+        """
+        interval = _READY_POLL_INITIAL_INTERVAL
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    try:
+                        response = await self.httpx_client.get(
+                            f'http://localhost:{port}/alive',
+                            timeout=_READY_POLL_REQUEST_TIMEOUT,
+                        )
+                        if response.status_code == 200:
+                            return True
+                    except Exception:
+                        pass
+                    await asyncio.sleep(interval)
+                    interval = min(interval * 2, _READY_POLL_MAX_INTERVAL)
+        except TimeoutError:
+            return False
+
+    async def search_sandboxes(
+        self,
+        page_id: str | None = None,
+        limit: int = 100,
     ) -> SandboxPage:
-        """List all sandboxes."""
-        items = []
-        for sandbox_id, info in _worktrees.items():
-            items.append(
-                SandboxInfo(
-                    id=sandbox_id,
-                    status=self._get_sandbox_status(info),
-                    created_at=info.created_at,
-                    user_id=info.user_id,
-                    sandbox_spec_id=info.sandbox_spec_id,
-                )
+        """Search for sandboxes."""
+        # Sort by creation time (newest first)
+        worktree_items = sorted(
+            _worktrees.items(), key=lambda x: x[1].created_at, reverse=True
+        )
+
+        # Apply pagination
+        start_idx = 0
+        if page_id:
+            try:
+                start_idx = int(page_id)
+            except ValueError:
+                start_idx = 0
+        end_idx = start_idx + limit
+        page_items = worktree_items[start_idx:end_idx]
+
+        # Status checks touch /proc, so overlap them in worker threads
+        statuses = await asyncio.gather(
+            *(
+                asyncio.to_thread(self._get_sandbox_status, sandbox_id)
+                for sandbox_id, _ in page_items
             )
-        return SandboxPage(items=items, next_page_id=None)
+        )
+        items = [
+            self._to_sandbox_info(sandbox_id, info, status)
+            for (sandbox_id, info), status in zip(page_items, statuses, strict=True)
+        ]
+
+        next_page_id = None
+        if end_idx < len(worktree_items):
+            next_page_id = str(end_idx)
+        return SandboxPage(items=items, next_page_id=next_page_id)
 
     async def get_sandbox(self, sandbox_id: str) -> SandboxInfo | None:
         """Get a sandbox by ID."""
         info = _worktrees.get(sandbox_id)
         if info is None:
             return None
-        return SandboxInfo(
-            id=sandbox_id,
-            status=self._get_sandbox_status(info),
-            created_at=info.created_at,
-            user_id=info.user_id,
-            sandbox_spec_id=info.sandbox_spec_id,
-        )
+        return await self._worktree_to_sandbox_info(sandbox_id, info)
 
-    def _get_sandbox_status(self, info: WorktreeInfo) -> SandboxStatus:
-        """Get the status of a worktree."""
+    def _get_sandbox_status(self, sandbox_id: str) -> SandboxStatus:
+        """Get the status of a worktree.
+
+        A live server is STARTING until it has passed its readiness check.
+        """
+        info = _worktrees.get(sandbox_id)
+        process = _process_cache.get(sandbox_id)
+        if info is None or process is None:
+            return SandboxStatus.MISSING
         try:
-            import psutil
-            process = psutil.Process(info.pid)
-            if process.is_running():
-                return SandboxStatus.RUNNING
+            if process.is_running() and process.status() != psutil.STATUS_ZOMBIE:
+                return SandboxStatus.RUNNING if info.ready else SandboxStatus.STARTING
         except (psutil.NoSuchProcess, psutil.AccessDenied):
             pass
-        return SandboxStatus.STOPPED
+        return SandboxStatus.MISSING
 
-    async def find_sandbox_by_session_api_key(
+    async def get_sandbox_by_session_api_key(
         self, session_api_key: str
     ) -> SandboxInfo | None:
-        """Find a sandbox by session API key."""
-        for sandbox_id, info in _worktrees.items():
-            if info.session_api_key == session_api_key:
-                return await self.get_sandbox(sandbox_id)
-        return None
+        """Get a sandbox by session API key."""
+        sandbox_id = _worktrees_by_api_key.get(session_api_key)
+        if sandbox_id is None:
+            return None
+        return await self.get_sandbox(sandbox_id)
 
     async def start_sandbox(
-        self,
-        sandbox_id: str,
-        sandbox_spec_id: str,
-        session_api_key: str,
+        self, sandbox_spec_id: str | None = None, sandbox_id: str | None = None
     ) -> SandboxInfo:
-        """Start a new worktree sandbox."""
-        # Get sandbox spec
-        sandbox_spec = await self.sandbox_spec_service.get_sandbox_spec(
-            sandbox_spec_id
-        )
-        if sandbox_spec is None:
-            raise SandboxError(f'Sandbox spec not found: {sandbox_spec_id}')
-
-        # Find port
-        port = self._find_unused_port()
+        """Start a new worktree sandbox.
 
-        # Create worktree directory
-        worktree_path = self._create_worktree_directory(sandbox_id)
-
-        # Start worktree process
-        process = await self._start_worktree_process(
-            sandbox_id=sandbox_id,
-            port=port,
-            worktree_path=worktree_path,
-            session_api_key=session_api_key,
-            sandbox_spec=sandbox_spec,
-        )
+        Takes the arguments of ``SandboxService.start_sandbox``: the default
+        spec is used if none is given, and a random ID if no ID is given.
+        """
+        # Get sandbox spec
+        if sandbox_spec_id is None:
+            sandbox_spec = await self.sandbox_spec_service.get_default_sandbox_spec()
+        else:
+            sandbox_spec_maybe = await self.sandbox_spec_service.get_sandbox_spec(
+                sandbox_spec_id
+            )
+            if sandbox_spec_maybe is None:
+                raise SandboxError(f'Sandbox spec not found: {sandbox_spec_id}')
+            sandbox_spec = sandbox_spec_maybe
+
+        # Use provided sandbox_id if available, otherwise generate a random one
+        if sandbox_id is None:
+            sandbox_id = base62.encodebytes(os.urandom(16))
+        session_api_key = base62.encodebytes(os.urandom(32))
+
+        # Reserve port
+        port_socket = self._reserve_port()
+        port = port_socket.getsockname()[1]
+        _reserved_ports.add(port)
+        if sys.platform != 'linux':
+            port_socket.close()
+
+        worktree_path: str | None = None
+        try:
+            # Create worktree directory
+            worktree_path = await self._create_worktree_directory(sandbox_id)
+
+            # Start worktree process
+            process = await self._start_worktree_process(
+                sandbox_id=sandbox_id,
+                port=port,
+                worktree_path=worktree_path,
+                session_api_key=session_api_key,
+                sandbox_spec=sandbox_spec,
+            )
+        except BaseException:
+            port_socket.close()
+            _reserved_ports.discard(port)
+            # A leftover worktree would be reused by the next start with this ID
+            if worktree_path is not None:
+                await self._discard_worktree(sandbox_id, worktree_path)
+            raise
 
         # Store info
         worktree_info = WorktreeInfo(
@@ -275,34 +513,100 @@ class WorktreeSandboxService(SandboxService):
             user_id=self.user_id,
             session_api_key=session_api_key,
             created_at=utc_now(),
-            sandbox_spec_id=sandbox_spec_id,
+            sandbox_spec_id=sandbox_spec.id,
         )
         _worktrees[sandbox_id] = worktree_info
+        _worktrees_by_api_key[session_api_key] = sandbox_id
+        try:
+            _process_cache[sandbox_id] = psutil.Process(process.pid)
+        except psutil.NoSuchProcess:
+            pass
 
-        # Wait for server
-        if not await self._wait_for_server_ready(port):
-            await self.delete_sandbox(sandbox_id)
-            raise SandboxError('Worktree sandbox failed to start')
+        # Wait for server. Once it is listening (or has failed) the placeholder
+        # socket is no longer needed to hold the port.
+        try:
+            await self._wait_for_worktree_ready(sandbox_id, process, port)
+        finally:
+            port_socket.close()
+
+        worktree_info = worktree_info.model_copy(update={'ready': True})
+        # The sandbox may have been deleted while it was starting
+        if sandbox_id in _worktrees:
+            _worktrees[sandbox_id] = worktree_info
 
         return await self._worktree_to_sandbox_info(sandbox_id, worktree_info)
 
+    async def start_sandboxes(
+        self, requests: list[tuple[str | None, str | None]]
+    ) -> list[SandboxInfo]:
+        """Start several worktree sandboxes concurrently.
+
+        Each request is a ``(sandbox_spec_id, sandbox_id)`` tuple as taken by
+        ``start_sandbox``, and results are returned in the same order. At most
+        ``_MAX_CONCURRENT_STARTS`` servers are spawned at once. If any start
+        fails, the sandboxes from this batch that did start are deleted and the
+        first error is raised.
+        """
+        semaphore = asyncio.Semaphore(_MAX_CONCURRENT_STARTS)
+
+        async def start(request: tuple[str | None, str | None]) -> SandboxInfo:
+            async with semaphore:
+                return await self.start_sandbox(*request)
+
+        # Initialize the shared base repository once up front rather than
+        # having every start queue on its lock
+        await asyncio.to_thread(self._ensure_base_repository)
+
+        results = await asyncio.gather(
+            *(start(request) for request in requests), return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await asyncio.gather(
+                *(
+                    self.delete_sandbox(r.id)
+                    for r in results
+                    if isinstance(r, SandboxInfo)
+                )
+            )
+            raise errors[0]
+        return [r for r in results if isinstance(r, SandboxInfo)]
+
     async def _worktree_to_sandbox_info(
         self, sandbox_id: str, info: WorktreeInfo
     ) -> SandboxInfo:
         """Convert WorktreeInfo to SandboxInfo."""
-        return SandboxInfo(
-            id=sandbox_id,
-            status=self._get_sandbox_status(info),
-            created_at=info.created_at,
-            user_id=info.user_id,
-            sandbox_spec_id=info.sandbox_spec_id,
-            exposed_urls=[
+        return self._to_sandbox_info(
+            sandbox_id, info, self._get_sandbox_status(sandbox_id)
+        )
+
+    def _to_sandbox_info(
+        self, sandbox_id: str, info: WorktreeInfo, status: SandboxStatus
+    ) -> SandboxInfo:
+        """Build the SandboxInfo for a worktree with an already known status.
+
+        The session API key and URLs are only exposed while the server runs,
+        as in ``ProcessSandboxService``.
+        """
+        session_api_key = None
+        exposed_urls = None
+        if status == SandboxStatus.RUNNING:
+            session_api_key = info.session_api_key
+            exposed_urls = [
                 ExposedUrl(
                     name=AGENT_SERVER,
                     url=f'http://localhost:{info.port}',
                     port=info.port,
                 )
-            ],
+            ]
+        return SandboxInfo(
+            id=sandbox_id,
+            created_by_user_id=info.user_id,
+            sandbox_spec_id=info.sandbox_spec_id,
+            status=status,
+            session_api_key=session_api_key,
+            exposed_urls=exposed_urls,
+            created_at=info.created_at,
         )
 
     async def resume_sandbox(self, sandbox_id: str) -> bool:
@@ -317,13 +621,66 @@ class WorktreeSandboxService(SandboxService):
 
     async def delete_sandbox(self, sandbox_id: str) -> bool:
         """Delete a worktree sandbox."""
-        info = _worktrees.get(sandbox_id)
+        # Claim the entry before any await so concurrent deletes of the same
+        # sandbox don't both run the cleanup
+        info = _worktrees.pop(sandbox_id, None)
         if info is None:
+            return False
+        _worktrees_by_api_key.pop(info.session_api_key, None)
+        _process_cache.pop(sandbox_id, None)
+        _reserved_ports.discard(info.port)
+
+        try:
+            if await asyncio.to_thread(self._cleanup_worktree_sync, sandbox_id, info):
+                await self._remove_worktree_directory(info.worktree_path)
+        except Exception as e:
+            _logger.warning(f'Error deleting worktree {sandbox_id}: {e}')
+        return True
+
+    def _terminate_with_pidfd(self, pid: int) -> bool:
+        """Terminate a process through a pidfd, where the platform supports it.
+
+        The pidfd becomes readable when the process exits, so waiting is a single
+        select() instead of psutil's polling loop, and signals can't reach a
+        process that has reused the pid. Returns False if pidfds are unavailable
+        so the caller can fall back to psutil.
+        """
+        try:
+            pidfd = os.pidfd_open(pid)
+        except ProcessLookupError:
             return True
+        except (AttributeError, OSError):
+            return False
+
+        try:
+            signal.pidfd_send_signal(pidfd, signal.SIGTERM)
+            readable, _, _ = select.select([pidfd], [], [], 5)
+            if not readable:
+                signal.pidfd_send_signal(pidfd, signal.SIGKILL)
+                select.select([pidfd], [], [], 2)
+        except ProcessLookupError:
+            pass
+        finally:
+            os.close(pidfd)
+        return True
 
+    async def _discard_worktree(self, sandbox_id: str, worktree_path: str) -> None:
+        """Remove the log and worktree of a sandbox whose server never started."""
         try:
-            # Kill process
-            import psutil
+            if await asyncio.to_thread(
+                self._detach_worktree_sync, sandbox_id, worktree_path
+            ):
+                await self._remove_worktree_directory(worktree_path)
+        except Exception as e:
+            _logger.warning(f'Error discarding worktree {sandbox_id}: {e}')
+
+    def _cleanup_worktree_sync(self, sandbox_id: str, info: WorktreeInfo) -> bool:
+        """Stop the server, remove its log and detach its worktree (blocking).
+
+        Returns whether any of the worktree directory is left to remove.
+        """
+        # Kill process
+        if not self._terminate_with_pidfd(info.pid):
             try:
                 process = psutil.Process(info.pid)
                 process.terminate()
@@ -335,26 +692,59 @@ class WorktreeSandboxService(SandboxService):
             except psutil.NoSuchProcess:
                 pass
 
-            # Clean up directory
-            import shutil
-            if os.path.exists(info.worktree_path):
-                shutil.rmtree(info.worktree_path, ignore_errors=True)
-
-            del _worktrees[sandbox_id]
-            return True
-
-        except Exception as e:
-            _logger.warning(f'Error deleting worktree {sandbox_id}: {e}')
-            if sandbox_id in _worktrees:
-                del _worktrees[sandbox_id]
-            return True
+        return self._detach_worktree_sync(sandbox_id, info.worktree_path)
+
+    def _detach_worktree_sync(self, sandbox_id: str, worktree_path: str) -> bool:
+        """Remove a sandbox's log and detach its worktree (blocking).
+
+        Returns whether any of the worktree directory is left to remove.
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._get_log_path(sandbox_id))
+
+        # Detach the worktree from the base repository
+        subprocess.run(
+            [
+                'git',
+                '-C',
+                self.base_repo_path,
+                'worktree',
+                'remove',
+                '--force',
+                worktree_path,
+            ],
+            capture_output=True,
+            check=False,
+        )
+        return os.path.exists(worktree_path)
+
+    async def _remove_worktree_directory(self, worktree_path: str) -> None:
+        """Remove whatever `git worktree remove` left of a worktree directory."""
+        # A single `rm -rf` avoids a Python-level unlink/rmdir per entry
+        if sys.platform != 'win32' and shutil.which('rm'):
+            process = await asyncio.create_subprocess_exec(
+                'rm',
+                '-rf',
+                worktree_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                _logger.warning(
+                    f'Failed to remove worktree {worktree_path}: {stderr.decode()}'
+                )
+        else:
+            await asyncio.to_thread(shutil.rmtree, worktree_path, ignore_errors=True)
 
     async def get_sandbox_logs(
         self, sandbox_id: str
     ) -> AsyncGenerator[bytes, None]:
         """Get logs for a sandbox."""
-        # TODO: Implement log streaming
-        yield b'Logs not implemented for worktree sandbox'
+        if sandbox_id not in _worktrees:
+            raise SandboxError(f'Sandbox not found: {sandbox_id}')
+        async for chunk in _stream_file(self._get_log_path(sandbox_id)):
+            yield chunk
 
     async def execute_command(
         self,
@@ -365,30 +755,47 @@ class WorktreeSandboxService(SandboxService):
         """Execute a command in a sandbox."""
         raise SandboxError('Command execution not supported for worktree sandboxes')
 
+    def _get_worktree_file_path(self, sandbox_id: str, path: str) -> str:
+        """Resolve a path inside a sandbox's worktree."""
+        info = _worktrees.get(sandbox_id)
+        if info is None:
+            raise SandboxError(f'Sandbox not found: {sandbox_id}')
+        return os.path.join(info.worktree_path, path)
+
+    async def read_file_stream(
+        self, sandbox_id: str, path: str, chunk_size: int = _FILE_CHUNK_SIZE
+    ) -> AsyncGenerator[bytes, None]:
+        """Read a file from a sandbox in fixed-size chunks."""
+        file_path = self._get_worktree_file_path(sandbox_id, path)
+        async for chunk in _stream_file(file_path, chunk_size):
+            yield chunk
+
     async def read_file(
         self, sandbox_id: str, path: str
     ) -> bytes:
         """Read a file from a sandbox."""
-        info = _worktrees.get(sandbox_id)
-        if info is None:
-            raise SandboxError(f'Sandbox not found: {sandbox_id}')
-        
-        file_path = os.path.join(info.worktree_path, path)
-        with open(file_path, 'rb') as f:
-            return f.read()
+        return b''.join(
+            [chunk async for chunk in self.read_file_stream(sandbox_id, path)]
+        )
 
     async def write_file(
-        self, sandbox_id: str, path: str, content: bytes
+        self, sandbox_id: str, path: str, content: bytes | AsyncIterable[bytes]
     ) -> None:
-        """Write a file to a sandbox."""
-        info = _worktrees.get(sandbox_id)
-        if info is None:
-            raise SandboxError(f'Sandbox not found: {sandbox_id}')
-        
-        file_path = os.path.join(info.worktree_path, path)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'wb') as f:
-            f.write(content)
+        """Write a file to a sandbox.
+
+        ``content`` may be the whole file or an async iterable of chunks.
+        """
+        file_path = self._get_worktree_file_path(sandbox_id, path)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(file_path), exist_ok=True)
+        f = await asyncio.to_thread(open, file_path, 'wb')
+        try:
+            if isinstance(content, bytes):
+                await asyncio.to_thread(f.write, content)
+            else:
+                async for chunk in content:
+                    await asyncio.to_thread(f.write, chunk)
+        finally:
+            f.close()
 
 
 class WorktreeSandboxServiceInjector(SandboxServiceInjector):
@@ -398,8 +805,19 @@ class WorktreeSandboxServiceInjector(SandboxServiceInjector):
         default='/tmp/openhands-worktrees',
         description='Base directory for worktree sandboxes',
     )
+    base_repo_path: str | None = Field(
+        default=None,
+        description=(
+            'Git repository that sandbox worktrees are created from. '
+            'Defaults to a repository inside base_working_dir.'
+        ),
+    )
     base_port: int = Field(
-        default=8000, description='Base port number for worktree sandboxes'
+        default=8000,
+        description=(
+            'Unused: worktree sandbox ports are assigned by the kernel. '
+            'Kept for configuration compatibility.'
+        ),
     )
     python_executable: str = Field(
         default='python',
@@ -415,6 +833,8 @@ class WorktreeSandboxServiceInjector(SandboxServiceInjector):
             get_user_context,
         )
 
+        # The shared client's default pool keeps localhost connections alive
+        # across the readiness probes issued while a sandbox starts
         async with (
             get_httpx_client(state, request) as httpx_client,
             get_sandbox_spec_service(state, request) as sandbox_spec_service,
@@ -425,6 +845,8 @@ class WorktreeSandboxServiceInjector(SandboxServiceInjector):
                 user_id=user_id,
                 sandbox_spec_service=sandbox_spec_service,
                 base_working_dir=self.base_working_dir,
+                base_repo_path=self.base_repo_path
+                or os.path.join(self.base_working_dir, '.base-repo'),
                 base_port=self.base_port,
                 python_executable=self.python_executable,
                 httpx_client=httpx_client,
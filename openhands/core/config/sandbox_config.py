@@ -51,6 +51,10 @@ class SandboxConfig(BaseModel):
         trusted_dirs: List of directories that can be trusted to run the OpenHands CLI.
         vscode_port: The port to use for VSCode. If None, a random port will be chosen.
             This is useful when deploying OpenHands in a remote machine where you need to expose a specific port.
+        worktree_sparse_paths: Directories to check out in each worktree of the worktree runtime.
+            Entries must be directories, not patterns. Default is ['/*'], which checks out the whole repository.
+        strict_port_ranges: Whether the worktree runtime must keep its server ports inside their configured ranges.
+            If False, a kernel-assigned port is used once a range is exhausted. Default is True.
     """
 
     remote_runtime_api_url: str | None = Field(default='http://localhost:8000')
@@ -95,6 +99,8 @@ class SandboxConfig(BaseModel):
     selected_repo: str | None = Field(default=None)
     trusted_dirs: list[str] = Field(default_factory=list)
     vscode_port: int | None = Field(default=None)
+    worktree_sparse_paths: list[str] = Field(default_factory=lambda: ['/*'])
+    strict_port_ranges: bool = Field(default=True)
     volumes: str | None = Field(
         default=None,
         description="Volume mounts in the format 'host_path:container_path[:mode]', e.g. '/my/host/dir:/workspace:rw'. Multiple mounts can be specified using commas, e.g. '/path1:/workspace/path1,/path2:/workspace/path2:ro'",
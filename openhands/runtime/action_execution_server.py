@@ -11,6 +11,7 @@ import json
 import mimetypes
 import os
 import shutil
+import socket
 import sys
 import tempfile
 import time
@@ -31,7 +32,8 @@ from openhands_aci.utils.diff import get_diff
 from pydantic import BaseModel
 from starlette.background import BackgroundTask
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from uvicorn import run
+from uvicorn import Config, Server
+from uvicorn.config import STARTUP_FAILURE
 
 from openhands.core.config.mcp_config import MCPStdioServerConfig
 from openhands.core.exceptions import BrowserUnavailableException
@@ -177,6 +179,27 @@ def _execute_file_editor(
     return result.output, (result.old_content, result.new_content)
 
 
+class ReadySignalServer(Server):
+    """Uvicorn server that reports readiness once it is accepting connections.
+
+    A parent that passed a pipe descriptor in ``READY_FD`` gets a line written
+    to it after the lifespan startup has run and the listening socket is bound,
+    so it can stop polling /alive as soon as the server is reachable.
+    """
+
+    async def startup(self, sockets: list[socket.socket] | None = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.started:
+            return
+        ready_fd = os.environ.pop('READY_FD', None)
+        if ready_fd:
+            try:
+                os.write(int(ready_fd), b'ok\n')
+                os.close(int(ready_fd))
+            except (OSError, ValueError) as e:
+                logger.warning(f'Could not signal readiness on READY_FD: {e}')
+
+
 class ActionExecutor:
     """ActionExecutor is running inside docker sandbox.
     It is responsible for executing actions received from OpenHands backend and producing observations.
@@ -1107,4 +1130,11 @@ if __name__ == '__main__':
     log_config = None
     if os.getenv('LOG_JSON', '0') in ('1', 'true', 'True'):
         log_config = get_uvicorn_json_log_config()
-    run(app, host='0.0.0.0', port=args.port, log_config=log_config, use_colors=False)
+    server = ReadySignalServer(
+        Config(
+            app, host='0.0.0.0', port=args.port, log_config=log_config, use_colors=False
+        )
+    )
+    server.run()
+    if not server.started:
+        sys.exit(STARTUP_FAILURE)
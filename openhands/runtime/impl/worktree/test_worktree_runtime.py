@@ -4,13 +4,21 @@ These tests verify the functionality of the WorktreeRuntime class,
 including worktree creation, server management, and cleanup.
 """
 
+import asyncio
+import errno
 import os
 import shutil
+import signal
 import subprocess
+import sys
 import tempfile
+import threading
+import time
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, PropertyMock, patch
 
+import httpx
+import psutil
 import pytest
 
 from openhands.core.config import OpenHandsConfig
@@ -18,9 +26,17 @@ from openhands.core.exceptions import AgentRuntimeError
 from openhands.events import EventStream
 from openhands.llm.llm_registry import LLMRegistry
 from openhands.runtime.impl.worktree.worktree_runtime import (
+    HAS_PYGIT2,
     WORKTREE_NAME_PREFIX,
+    ActionExecutionServerInfo,
     WorktreeRuntime,
+    _rmtree,
 )
+from openhands.runtime.plugins import JupyterRequirement
+from openhands.runtime.plugins.vscode import VSCodeRequirement
+from openhands.runtime.runtime_status import RuntimeStatus
+
+MODULE = 'openhands.runtime.impl.worktree.worktree_runtime'
 
 
 @pytest.fixture
@@ -66,21 +82,133 @@ def temp_repo():
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+@pytest.fixture(params=[True, False], ids=['pygit2', 'git-cli'])
+def git_backend(request):
+    """Run a test against both the pygit2 and the git CLI code paths."""
+    if request.param and not HAS_PYGIT2:
+        pytest.skip('pygit2 is not installed')
+    with patch(
+        'openhands.runtime.impl.worktree.worktree_runtime.HAS_PYGIT2', request.param
+    ):
+        yield request.param
+
+
 @pytest.fixture
 def mock_config():
     """Create a mock OpenHandsConfig."""
     config = MagicMock(spec=OpenHandsConfig)
     config.sandbox = MagicMock()
     config.sandbox.vscode_port = None
+    config.sandbox.worktree_sparse_paths = ['/*']
+    config.sandbox.strict_port_ranges = True
     config.sandbox.runtime_startup_env_vars = {}
     config.sandbox.keep_runtime_alive = False
     config.debug = False
     config.workspace_base = '/tmp'
     config.workspace_mount_path = '/tmp'
     config.workspace_mount_path_in_sandbox = '/workspace'
+    # The runtime works on a deep copy, so hand the copy the same settings
+    copied = config.__deepcopy__.return_value
+    copied.sandbox = config.sandbox
+    copied.debug = config.debug
     return config
 
 
+@pytest.fixture
+def fake_server(mock_config, temp_repo):
+    """Start a fake server child on a runtime, handing it a READY_FD pipe.
+
+    Returns a function taking the child's Python source and returning the
+    runtime. The children are killed afterwards.
+    """
+    runtimes = []
+
+    def start(script: str, start_new_session: bool = False) -> WorktreeRuntime:
+        runtime = WorktreeRuntime(
+            config=mock_config,
+            event_stream=MagicMock(),
+            llm_registry=MagicMock(),
+            sid='test-ready',
+            base_repo_path=temp_repo,
+        )
+        ready_fd, ready_write_fd = os.pipe()
+        process = subprocess.Popen(
+            [sys.executable, '-c', script],
+            env={**os.environ, 'READY_FD': str(ready_write_fd)},
+            pass_fds=(ready_write_fd,),
+            start_new_session=start_new_session,
+        )
+        os.close(ready_write_fd)
+        runtimes.append(runtime)
+        runtime._server_info = ActionExecutionServerInfo(
+            process=process,
+            execution_server_port=0,
+            vscode_port=0,
+            app_ports=[],
+            log_thread=MagicMock(),
+            log_thread_exit_event=threading.Event(),
+            worktree_path=temp_repo,
+            worktree_name=runtime.worktree_name,
+            ready_fd=ready_fd,
+        )
+        return runtime
+
+    yield start
+    for runtime in runtimes:
+        if runtime._server_info is not None:
+            runtime._server_info.process.kill()
+            runtime._server_info.process.wait()
+            # The runtime is closed at exit; keep it away from the fake server
+            runtime._server_info = None
+
+
+SIGNALLING_SERVER = (
+    "import os, time; os.write(int(os.environ['READY_FD']), b'ok\\n'); time.sleep(60)"
+)
+SILENT_SERVER = 'import time; time.sleep(60)'
+# Spawns a child that ignores SIGTERM, and signals READY_FD once it does
+STUBBORN_CHILD_SERVER = """
+import os, subprocess, sys, time
+ready_fd = int(os.environ['READY_FD'])
+subprocess.Popen(
+    [
+        sys.executable,
+        '-c',
+        'import os, signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); '
+        f'os.write({ready_fd}, b"ok"); time.sleep(60)',
+    ],
+    pass_fds=(ready_fd,),
+)
+time.sleep(60)
+"""
+
+
+def _spawn_env(runtime: WorktreeRuntime) -> dict[str, str]:
+    """Run _start_server with the spawn mocked out and return the server's env."""
+    with (
+        patch(f'{MODULE}.subprocess.Popen') as popen,
+        patch.object(runtime, '_stream_logs'),
+    ):
+        popen.return_value.pid = os.getpid()
+        server_info = runtime._start_server()
+    if server_info.ready_fd is not None:
+        os.close(server_info.ready_fd)
+    return popen.call_args.kwargs['env']
+
+
+def _wait_until_gone(pid: int, timeout: float = 5) -> bool:
+    """Wait for a process to exit, counting an unreaped zombie as gone."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if psutil.Process(pid).status() == psutil.STATUS_ZOMBIE:
+                return True
+        except psutil.NoSuchProcess:
+            return True
+        time.sleep(0.05)
+    return False
+
+
 @pytest.fixture
 def mock_event_stream():
     """Create a mock EventStream."""
@@ -111,6 +239,34 @@ class TestWorktreeRuntime:
         assert runtime.base_repo_path == temp_repo
         assert runtime.worktree_path is None
 
+    @pytest.mark.parametrize(
+        'plugins,disabled,expected',
+        [
+            (None, False, 1),
+            ([JupyterRequirement()], False, 1),
+            ([VSCodeRequirement()], False, 1),
+            (None, True, 0),
+        ],
+        ids=['default', 'other-plugin', 'already-present', 'disabled'],
+    )
+    def test_vscode_plugin(self, mock_config, temp_repo, plugins, disabled, expected):
+        """Test that the VSCode plugin is added once unless it is disabled."""
+        with patch(f'{MODULE}.DISABLE_VSCODE_PLUGIN', disabled):
+            runtime = WorktreeRuntime(
+                config=mock_config,
+                event_stream=MagicMock(),
+                llm_registry=MagicMock(),
+                plugins=plugins,
+                base_repo_path=temp_repo,
+            )
+
+        vscode_plugins = [
+            p for p in runtime.plugins if isinstance(p, VSCodeRequirement)
+        ]
+        assert len(vscode_plugins) == expected
+        if plugins:
+            assert type(plugins[0]) in {type(p) for p in runtime.plugins}
+
     def test_is_git_repository(self, temp_repo):
         """Test _is_git_repository method."""
         runtime = WorktreeRuntime(
@@ -123,6 +279,55 @@ class TestWorktreeRuntime:
         assert runtime._is_git_repository(temp_repo) is True
         assert runtime._is_git_repository('/nonexistent/path') is False
 
+    @pytest.mark.parametrize('dot_git', ['dir', 'file'])
+    def test_is_git_repository_fast_path(self, temp_repo, dot_git):
+        """Test that a .git directory or file is enough, without asking git."""
+        path = tempfile.mkdtemp()
+        try:
+            if dot_git == 'dir':
+                os.mkdir(os.path.join(path, '.git'))
+            else:
+                Path(path, '.git').write_text('gitdir: /elsewhere\n')
+            runtime = WorktreeRuntime(
+                config=MagicMock(),
+                event_stream=MagicMock(),
+                llm_registry=MagicMock(),
+                base_repo_path=temp_repo,
+            )
+            with patch.object(runtime, '_discover_git_repository') as discover:
+                assert runtime._is_git_repository(path) is True
+            discover.assert_not_called()
+        finally:
+            WorktreeRuntime._repo_cache.pop(path, None)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_is_git_repository_caches_positive_results(self, temp_repo):
+        """Test that only positive results are cached."""
+        path = tempfile.mkdtemp()
+        try:
+            runtime = WorktreeRuntime(
+                config=MagicMock(),
+                event_stream=MagicMock(),
+                llm_registry=MagicMock(),
+                base_repo_path=temp_repo,
+            )
+            with patch.object(
+                runtime, '_discover_git_repository', return_value=False
+            ) as discover:
+                assert runtime._is_git_repository(path) is False
+                assert runtime._is_git_repository(path) is False
+            assert discover.call_count == 2
+
+            # Initialized later, so picked up on the next call, then cached
+            os.mkdir(os.path.join(path, '.git'))
+            assert runtime._is_git_repository(path) is True
+            os.rmdir(os.path.join(path, '.git'))
+            assert runtime._is_git_repository(path) is True
+        finally:
+            WorktreeRuntime._repo_cache.pop(path, None)
+            shutil.rmtree(path, ignore_errors=True)
+
+    @pytest.mark.usefixtures('git_backend')
     def test_init_base_repository(self, temp_repo):
         """Test _init_base_repository method."""
         # Create a non-git directory
@@ -141,6 +346,7 @@ class TestWorktreeRuntime:
         finally:
             shutil.rmtree(non_git_dir, ignore_errors=True)
 
+    @pytest.mark.usefixtures('git_backend')
     def test_create_worktree(self, temp_repo, mock_config, mock_event_stream, mock_llm_registry):
         """Test _create_worktree method."""
         runtime = WorktreeRuntime(
@@ -169,6 +375,7 @@ class TestWorktreeRuntime:
         # Clean up
         runtime._remove_worktree()
 
+    @pytest.mark.usefixtures('git_backend')
     def test_remove_worktree(self, temp_repo, mock_config, mock_event_stream, mock_llm_registry):
         """Test _remove_worktree method."""
         runtime = WorktreeRuntime(
@@ -187,22 +394,622 @@ class TestWorktreeRuntime:
         runtime._remove_worktree()
         assert not os.path.exists(worktree_path)
 
-    def test_find_available_ports(self, mock_config, mock_event_stream, mock_llm_registry, temp_repo):
-        """Test _find_available_ports method."""
+    def test_create_sparse_worktree(
+        self, temp_repo, mock_config, mock_event_stream, mock_llm_registry
+    ):
+        """Test that only the configured directories are checked out."""
+        for directory in ('src', 'docs'):
+            Path(temp_repo, directory).mkdir()
+            Path(temp_repo, directory, 'file.txt').write_text(directory)
+        subprocess.run(
+            ['git', 'add', '-A'], cwd=temp_repo, capture_output=True, check=True
+        )
+        subprocess.run(
+            ['git', 'commit', '-m', 'Add directories'],
+            cwd=temp_repo,
+            capture_output=True,
+            check=True,
+        )
+        mock_config.sandbox.worktree_sparse_paths = ['/src/']
+        runtime = WorktreeRuntime(
+            config=mock_config,
+            event_stream=mock_event_stream,
+            llm_registry=mock_llm_registry,
+            sid='test-sparse',
+            base_repo_path=temp_repo,
+        )
+
+        worktree_path = runtime._create_worktree()
+        try:
+            assert os.path.exists(os.path.join(worktree_path, 'src', 'file.txt'))
+            # Cone mode always keeps the files at the repository root
+            assert os.path.exists(os.path.join(worktree_path, 'README.md'))
+            assert not os.path.exists(os.path.join(worktree_path, 'docs'))
+        finally:
+            runtime._remove_worktree()
+
+    def test_create_worktree_checks_base_repository_once(
+        self, temp_repo, mock_config, mock_event_stream, mock_llm_registry
+    ):
+        """Test that the base repository is checked once per process, not per runtime."""
+        base_dir = tempfile.mkdtemp()
+        try:
+            with (
+                patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}),
+                patch.object(
+                    WorktreeRuntime, '_init_base_repository', autospec=True
+                ) as init_base_repository,
+            ):
+                runtimes = [
+                    WorktreeRuntime(
+                        config=mock_config,
+                        event_stream=mock_event_stream,
+                        llm_registry=mock_llm_registry,
+                        sid=f'test-base-once-{i}',
+                        base_repo_path=temp_repo,
+                    )
+                    for i in range(2)
+                ]
+                for runtime in runtimes:
+                    runtime._create_worktree()
+                for runtime in runtimes:
+                    runtime._remove_worktree()
+        finally:
+            WorktreeRuntime._base_repo_checked.discard(temp_repo)
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+        init_base_repository.assert_called_once()
+
+    @pytest.mark.usefixtures('git_backend')
+    def test_create_worktree_over_stale_directory(
+        self, temp_repo, mock_config, mock_event_stream, mock_llm_registry
+    ):
+        """Test creating a worktree under a missing base dir and over a stale one."""
+        base_dir = tempfile.mkdtemp()
+        nested_base = os.path.join(base_dir, 'nested', 'worktrees')
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': nested_base}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=mock_event_stream,
+                    llm_registry=mock_llm_registry,
+                    sid='test-stale',
+                    base_repo_path=temp_repo,
+                )
+                # The missing parents of the base dir are created
+                worktree_path = runtime._create_worktree()
+                assert os.path.isdir(worktree_path)
+
+                # A leftover checkout is removed once, without another stat
+                Path(worktree_path, 'stale.txt').write_text('stale\n')
+                runtime.worktree_path = None
+                with patch.object(
+                    runtime, '_remove_worktree', wraps=runtime._remove_worktree
+                ) as remove:
+                    assert runtime._create_worktree() == worktree_path
+                remove.assert_called_once_with(worktree_path, exists=True)
+                assert not os.path.exists(os.path.join(worktree_path, 'stale.txt'))
+                assert os.path.exists(os.path.join(worktree_path, 'README.md'))
+                runtime._remove_worktree()
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    @pytest.mark.parametrize('is_worktree', [True, False], ids=['git', 'stale-dir'])
+    def test_remove_worktree_rmtree_fallback(
+        self, temp_repo, mock_config, mock_event_stream, mock_llm_registry, is_worktree
+    ):
+        """Test that the directory walk only runs when git left something behind."""
+        runtime = WorktreeRuntime(
+            config=mock_config,
+            event_stream=mock_event_stream,
+            llm_registry=mock_llm_registry,
+            sid='test-remove-fallback',
+            base_repo_path=temp_repo,
+        )
+        with patch(f'{MODULE}.HAS_PYGIT2', False):
+            if is_worktree:
+                worktree_path = runtime._create_worktree()
+            else:
+                worktree_path = os.path.join(
+                    runtime._get_worktree_base_dir(), runtime.worktree_name
+                )
+                os.makedirs(worktree_path, exist_ok=True)
+            with patch(f'{MODULE}._rmtree', wraps=_rmtree) as rmtree:
+                runtime._remove_worktree(worktree_path)
+
+        assert not os.path.exists(worktree_path)
+        assert rmtree.called is not is_worktree
+
+    def test_rmtree_retries_busy_entries(self):
+        """Test that entries failing with EBUSY are retried, other errors ignored."""
+        busy = OSError(errno.EBUSY, 'busy')
+        remove = MagicMock(side_effect=[busy, None])
+        other = MagicMock()
+
+        def fake_rmtree(path, onexc):
+            onexc(remove, f'{path}/busy', busy)
+            onexc(other, f'{path}/denied', PermissionError(errno.EACCES, 'denied'))
+
+        with (
+            patch(f'{MODULE}.shutil.rmtree', side_effect=fake_rmtree),
+            patch(f'{MODULE}.RMTREE_BUSY_DELAY', 0),
+        ):
+            _rmtree('/some/worktree')
+
+        assert remove.call_count == 2
+        other.assert_not_called()
+
+    def test_get_cone_paths(self):
+        """Test normalizing sparse paths into cone mode directories."""
+        assert WorktreeRuntime._get_cone_paths(['/*']) is None
+        assert WorktreeRuntime._get_cone_paths(['/*', 'src']) is None
+        assert WorktreeRuntime._get_cone_paths(['/src', 'docs/', '/lib/*']) == [
+            'src',
+            'docs',
+            'lib',
+        ]
+        for pattern in ('*.py', 'src/*.py', '!docs', 'src/[ab]'):
+            with pytest.raises(AgentRuntimeError):
+                WorktreeRuntime._get_cone_paths([pattern])
+
+    def test_start_server_isolates_caches(self, mock_config, temp_repo):
+        """Test that each session gets its own temp and tool cache directories."""
+        base_dir = tempfile.mkdtemp()
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=MagicMock(),
+                    llm_registry=MagicMock(),
+                    sid='test-caches',
+                    base_repo_path=temp_repo,
+                )
+                runtime.worktree_path = temp_repo
+                env = _spawn_env(runtime)
+
+                cache_root = os.path.join(base_dir, 'cache', 'test-caches')
+                assert runtime._get_cache_root() == cache_root
+                for key, name in {
+                    'TMPDIR': 'tmp',
+                    'PIP_CACHE_DIR': 'pip',
+                    'XDG_CACHE_HOME': 'xdg',
+                    'npm_config_cache': 'npm',
+                    'CARGO_TARGET_DIR': 'cargo',
+                }.items():
+                    assert env[key] == os.path.join(cache_root, name)
+                    assert os.path.isdir(env[key])
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    def test_start_server_env(self, mock_config, temp_repo):
+        """Test the server env: a cached base plus per-run values and overrides."""
+        base_dir = tempfile.mkdtemp()
+        try:
+            with patch.dict(
+                os.environ,
+                {'OPENHANDS_WORKTREE_BASE_DIR': base_dir, 'EARLY_VAR': 'early'},
+            ):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=MagicMock(),
+                    llm_registry=MagicMock(),
+                    sid='test-env',
+                    base_repo_path=temp_repo,
+                )
+                runtime.worktree_path = temp_repo
+                runtime.config.sandbox.runtime_startup_env_vars = {
+                    'TMPDIR': '/custom/tmp',
+                    'EXTRA_VAR': 'extra',
+                }
+                # Set after construction, so the cached base env misses it
+                os.environ['LATE_VAR'] = 'late'
+                env = _spawn_env(runtime)
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+        assert env['EARLY_VAR'] == 'early'
+        assert 'LATE_VAR' not in env
+        assert env['OPENHANDS_SESSION_ID'] == 'test-env'
+        assert env['OPENHANDS_WORKTREE_PATH'] == temp_repo
+        assert env['port'].isdigit()
+        # Startup env vars take precedence over the per-run values
+        assert env['TMPDIR'] == '/custom/tmp'
+        assert env['EXTRA_VAR'] == 'extra'
+        # The per-run values never leak into the cached base
+        assert 'port' not in runtime._base_env
+
+    @pytest.mark.usefixtures('git_backend')
+    def test_connect_failure_cleans_up(
+        self, mock_config, mock_event_stream, mock_llm_registry, temp_repo
+    ):
+        """Test that a failed connect removes the worktree, cache and registry row."""
+        base_dir = tempfile.mkdtemp()
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=mock_event_stream,
+                    llm_registry=mock_llm_registry,
+                    sid='test-connect-failure',
+                    base_repo_path=temp_repo,
+                )
+
+                def fail_to_start():
+                    runtime._reserve_ports_atomic()
+                    os.makedirs(os.path.join(runtime._get_cache_root(), 'tmp'))
+                    raise AgentRuntimeError('server failed')
+
+                with patch.object(runtime, '_start_server', side_effect=fail_to_start):
+                    with pytest.raises(AgentRuntimeError):
+                        asyncio.run(runtime.connect())
+
+                assert not os.path.exists(runtime.worktree_path)
+                assert not os.path.exists(runtime._get_cache_root())
+                registry = WorktreeRuntime._read_registry(
+                    os.path.join(base_dir, 'registry.json')
+                )
+                assert 'test-connect-failure' not in registry['sids']
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    def test_connect_reports_starting_once(self, mock_config, temp_repo):
+        """Test that connect() reports STARTING_RUNTIME once, then READY."""
+        status_callback = MagicMock()
+        runtime = WorktreeRuntime(
+            config=mock_config,
+            event_stream=MagicMock(),
+            llm_registry=MagicMock(),
+            sid='test-status',
+            base_repo_path=temp_repo,
+            status_callback=status_callback,
+        )
+        with (
+            patch.object(runtime, '_reap_orphans_once'),
+            patch.object(runtime, '_create_worktree', return_value=temp_repo),
+            patch.object(runtime, '_start_server', return_value=MagicMock()),
+            patch.object(runtime, 'wait_until_alive'),
+            patch.object(runtime, 'setup_initial_env'),
+            patch.object(
+                WorktreeRuntime, 'vscode_url', new_callable=PropertyMock
+            ) as vscode_url,
+        ):
+            vscode_url.return_value = None
+            try:
+                asyncio.run(runtime.connect())
+            finally:
+                runtime._server_info = None
+
+        statuses = [c.args[1] for c in status_callback.call_args_list]
+        assert statuses == [RuntimeStatus.STARTING_RUNTIME, RuntimeStatus.READY]
+
+    def test_reserve_ports_atomic(self, mock_config, mock_event_stream, mock_llm_registry, temp_repo):
+        """Test _reserve_ports_atomic method."""
         runtime = WorktreeRuntime(
             config=mock_config,
             event_stream=mock_event_stream,
             llm_registry=mock_llm_registry,
             base_repo_path=temp_repo,
         )
+        # The runtime works on a copy of the config
+        runtime.config.sandbox.vscode_port = None
+
+        with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': temp_repo}):
+            execution_port, vscode_port, app_ports = runtime._reserve_ports_atomic()
+            try:
+                assert isinstance(execution_port, int)
+                assert isinstance(vscode_port, int)
+                assert isinstance(app_ports, list)
+                assert len(app_ports) == 2
+                assert all(isinstance(p, int) for p in app_ports)
+                assert len(runtime._reserved_sockets) == 4
+            finally:
+                runtime._release_reserved_sockets()
+                runtime._unregister_session()
+
+    def test_reserve_ports_atomic_no_overlap(
+        self, mock_config, mock_event_stream, mock_llm_registry, temp_repo
+    ):
+        """Test that runtimes with the same port slot get distinct ports."""
+        runtimes = [
+            WorktreeRuntime(
+                config=mock_config,
+                event_stream=mock_event_stream,
+                llm_registry=mock_llm_registry,
+                sid=f'test-ports-{i}',
+                base_repo_path=temp_repo,
+            )
+            for i in range(2)
+        ]
+        for runtime in runtimes:
+            runtime.config.sandbox.vscode_port = None
+
+        with (
+            patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': temp_repo}),
+            patch(
+                'openhands.runtime.impl.worktree.worktree_runtime.PORT_SLOT_COUNT', 1
+            ),
+        ):
+            try:
+                first = runtimes[0]._reserve_ports_atomic()
+                # The registry keeps the ports taken even once the sockets close
+                runtimes[0]._release_reserved_sockets()
+                second = runtimes[1]._reserve_ports_atomic()
+                first_ports = {first[0], first[1], *first[2]}
+                second_ports = {second[0], second[1], *second[2]}
+                assert not first_ports & second_ports
+            finally:
+                for runtime in runtimes:
+                    runtime._release_reserved_sockets()
+                    runtime._unregister_session()
 
-        execution_port, vscode_port, app_ports = runtime._find_available_ports()
+    @pytest.mark.usefixtures('git_backend')
+    def test_delete(self, mock_config, mock_event_stream, mock_llm_registry, temp_repo):
+        """Test that delete removes everything a session left behind."""
+        base_dir = tempfile.mkdtemp()
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=mock_event_stream,
+                    llm_registry=mock_llm_registry,
+                    sid='test-delete',
+                    base_repo_path=temp_repo,
+                )
+                worktree_path = runtime._create_worktree()
+                runtime._reserve_ports_atomic()
+                runtime._release_reserved_sockets()
+                os.makedirs(runtime._get_cache_root())
+                os.makedirs(os.path.dirname(runtime._get_log_path()))
+                Path(runtime._get_log_path()).write_text('log\n')
+
+                asyncio.run(WorktreeRuntime.delete('test-delete'))
+
+                assert not os.path.exists(worktree_path)
+                assert not os.path.exists(runtime._get_cache_root())
+                assert not os.path.exists(runtime._get_log_path())
+                registry = WorktreeRuntime._read_registry(
+                    os.path.join(base_dir, 'registry.json')
+                )
+                assert 'test-delete' not in registry['sids']
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    def test_reap_orphans(
+        self, mock_config, mock_event_stream, mock_llm_registry, temp_repo
+    ):
+        """Test that a dead session's server and worktree are cleaned up."""
+        base_dir = tempfile.mkdtemp()
+        server = None
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=mock_event_stream,
+                    llm_registry=mock_llm_registry,
+                    sid='test-reap',
+                    base_repo_path=temp_repo,
+                )
+                worktree_path = runtime._create_worktree()
+                runtime._reserve_ports_atomic()
+                runtime._release_reserved_sockets()
+                server = subprocess.Popen(
+                    ['sleep', '60'], cwd=worktree_path, start_new_session=True
+                )
+                runtime._update_registry_row('server_pids', server.pid)
+
+                # Hand the row over to an owner that has already exited
+                owner = subprocess.Popen(['true'])
+                owner.wait()
+                registry_path = os.path.join(base_dir, 'registry.json')
+                registry = WorktreeRuntime._read_registry(registry_path)
+                registry['pids'] = [owner.pid]
+                WorktreeRuntime._write_registry(registry_path, registry, set())
+
+                WorktreeRuntime._reap_orphans()
+
+                assert server.wait(timeout=10) is not None
+                assert not os.path.exists(worktree_path)
+                registry = WorktreeRuntime._read_registry(registry_path)
+                assert 'test-reap' not in registry['sids']
+        finally:
+            if server is not None and server.poll() is None:
+                server.kill()
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    def test_reap_orphans_keeps_kept_alive_session(
+        self, mock_config, mock_event_stream, mock_llm_registry, temp_repo
+    ):
+        """Test that a session closed with keep_runtime_alive is not reaped."""
+        base_dir = tempfile.mkdtemp()
+        server = None
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=mock_event_stream,
+                    llm_registry=mock_llm_registry,
+                    sid='test-keep-alive',
+                    base_repo_path=temp_repo,
+                )
+                worktree_path = runtime._create_worktree()
+                runtime._reserve_ports_atomic()
+                runtime._release_reserved_sockets()
+                server = subprocess.Popen(
+                    ['sleep', '60'], cwd=worktree_path, start_new_session=True
+                )
+                runtime._update_registry_row('server_pids', server.pid)
+                os.makedirs(runtime._get_cache_root())
+
+                runtime.config.sandbox.keep_runtime_alive = True
+                runtime.close()
+
+                # The owner goes away, as it does when its process exits
+                owner = subprocess.Popen(['true'])
+                owner.wait()
+                registry_path = os.path.join(base_dir, 'registry.json')
+                registry = WorktreeRuntime._read_registry(registry_path)
+                registry['pids'] = [owner.pid]
+                WorktreeRuntime._write_registry(registry_path, registry, set())
+
+                WorktreeRuntime._reap_orphans()
+
+                assert server.poll() is None
+                assert os.path.exists(worktree_path)
+                assert os.path.exists(runtime._get_cache_root())
+                registry = WorktreeRuntime._read_registry(registry_path)
+                assert registry['sids'] == ['test-keep-alive']
+        finally:
+            if server is not None and server.poll() is None:
+                server.kill()
+                server.wait()
+            shutil.rmtree(base_dir, ignore_errors=True)
 
-        assert isinstance(execution_port, int)
-        assert isinstance(vscode_port, int)
-        assert isinstance(app_ports, list)
-        assert len(app_ports) == 2
-        assert all(isinstance(p, int) for p in app_ports)
+    def test_wait_until_alive_ready_signal(self, fake_server):
+        """Test that the READY_FD signal ends the wait without polling /alive."""
+        runtime = fake_server(SIGNALLING_SERVER)
+        with patch.object(runtime, 'check_if_alive') as check_if_alive:
+            start = time.monotonic()
+            runtime.wait_until_alive()
+
+        assert time.monotonic() - start < 2
+        # Only the confirming check once the pipe has been written to
+        check_if_alive.assert_called_once()
+        assert runtime._server_info.ready_fd is None
+
+    def test_wait_until_alive_falls_back_to_polling(self, fake_server):
+        """Test that a server that never writes to READY_FD is polled instead."""
+        runtime = fake_server(SILENT_SERVER)
+        with (
+            patch(f'{MODULE}.READY_FALLBACK_INTERVAL', 0.05),
+            patch.object(
+                runtime,
+                'check_if_alive',
+                side_effect=[httpx.ConnectError('refused')] * 2 + [None, None],
+            ) as check_if_alive,
+        ):
+            runtime.wait_until_alive()
+
+        # Two refused probes, the one that answered and the confirming check
+        assert check_if_alive.call_count == 4
+        assert runtime._server_info.ready_fd is None
+
+    def test_wait_until_alive_shares_one_deadline(self, fake_server):
+        """Test that the pipe wait and the /alive polling share one timeout."""
+        runtime = fake_server(SILENT_SERVER)
+        with (
+            patch(f'{MODULE}.READY_SIGNAL_TIMEOUT', 1),
+            patch(f'{MODULE}.READY_FALLBACK_INTERVAL', 0.05),
+            patch.object(
+                runtime, 'check_if_alive', side_effect=httpx.ConnectError('refused')
+            ),
+        ):
+            start = time.monotonic()
+            with pytest.raises(httpx.ConnectError):
+                runtime.wait_until_alive()
+
+        # Each phase getting its own timeout would take at least 2s
+        assert time.monotonic() - start < 1.5
+
+    def test_stop_server_kills_the_process_group(self, fake_server):
+        """Test that stopping the server also stops children ignoring SIGTERM."""
+        runtime = fake_server(STUBBORN_CHILD_SERVER, start_new_session=True)
+        server_info = runtime._server_info
+        assert os.read(server_info.ready_fd, 2) == b'ok'
+        process = server_info.process
+        (child,) = psutil.Process(process.pid).children()
+
+        with patch('os.killpg', wraps=os.killpg) as killpg:
+            runtime._stop_server()
+
+        assert process.returncode is not None
+        assert _wait_until_gone(child.pid)
+        # The group is only signalled while the server is unreaped
+        killpg.assert_called_once_with(process.pid, signal.SIGTERM)
+        assert runtime._server_info is None
+
+    def test_stop_server_without_process_groups(self, fake_server):
+        """Test that the server is terminated on its own without killpg."""
+        runtime = fake_server(SILENT_SERVER)
+        process = runtime._server_info.process
+
+        with (
+            patch(f'{MODULE}.HAS_PROCESS_GROUPS', False),
+            patch('os.killpg') as killpg,
+        ):
+            runtime._stop_server()
+
+        assert process.returncode is not None
+        killpg.assert_not_called()
+
+    def test_stream_logs(self, mock_config, temp_repo):
+        """Test that both server streams end up in the session's log file."""
+        base_dir = tempfile.mkdtemp()
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=MagicMock(),
+                    llm_registry=MagicMock(),
+                    sid='test-logs',
+                    base_repo_path=temp_repo,
+                )
+                process = subprocess.Popen(
+                    [
+                        sys.executable,
+                        '-c',
+                        'import sys; print("out\\nmore", flush=True); '
+                        'print("err", file=sys.stderr, flush=True); '
+                        'sys.stdout.write("unterminated")',
+                    ],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+                runtime._stream_logs(process, threading.Event())
+                process.wait()
+
+                lines = Path(runtime._get_log_path()).read_text().splitlines()
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+        assert sorted(lines) == [
+            '[SERVER-ERR] err',
+            '[SERVER] more',
+            '[SERVER] out',
+            '[SERVER] unterminated',
+        ]
+        assert lines.index('[SERVER] out') < lines.index('[SERVER] more')
+
+    def test_stream_logs_exits_on_event(self, mock_config, temp_repo):
+        """Test that the log thread exits once its exit event is set."""
+        base_dir = tempfile.mkdtemp()
+        process = subprocess.Popen(
+            [sys.executable, '-c', 'import time; time.sleep(60)'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            with patch.dict(os.environ, {'OPENHANDS_WORKTREE_BASE_DIR': base_dir}):
+                runtime = WorktreeRuntime(
+                    config=mock_config,
+                    event_stream=MagicMock(),
+                    llm_registry=MagicMock(),
+                    sid='test-logs-exit',
+                    base_repo_path=temp_repo,
+                )
+                exit_event = threading.Event()
+                thread = threading.Thread(
+                    target=runtime._stream_logs, args=(process, exit_event)
+                )
+                thread.start()
+                exit_event.set()
+                thread.join(timeout=5)
+
+            assert not thread.is_alive()
+            assert process.stdout.closed
+        finally:
+            process.kill()
+            process.wait()
+            shutil.rmtree(base_dir, ignore_errors=True)
 
     def test_get_worktree_base_dir(self, mock_config, mock_event_stream, mock_llm_registry, temp_repo):
         """Test _get_worktree_base_dir method."""
@@ -6,18 +6,30 @@ Each worktree shares the same git history but has its own working directory,
 enabling parallel agent execution on a single VPS.
 """
 
+import contextlib
+import errno
+import functools
+import json
+import logging
 import os
+import selectors
+import shlex
 import shutil
+import signal
+import socket
+import stat
 import subprocess
 import sys
 import tempfile
 import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Iterator
 from urllib.parse import urlparse
 
 import httpx
+import psutil
 import tenacity
 
 from openhands.core.config import OpenHandsConfig
@@ -38,7 +50,6 @@ from openhands.runtime.impl.action_execution.action_execution_client import (
 from openhands.runtime.plugins import PluginRequirement
 from openhands.runtime.plugins.vscode import VSCodeRequirement
 from openhands.runtime.runtime_status import RuntimeStatus
-from openhands.runtime.utils import find_available_tcp_port
 from openhands.runtime.utils.command import (
     DEFAULT_MAIN_MODULE,
     get_action_execution_server_startup_command,
@@ -47,6 +58,27 @@ from openhands.utils.async_utils import call_sync_from_async
 from openhands.utils.http_session import httpx_verify_option
 from openhands.utils.tenacity_stop import stop_if_should_exit
 
+# Use libgit2 through pygit2 when available so git operations run in-process
+# instead of spawning a git subprocess each time
+try:
+    import pygit2
+
+    HAS_PYGIT2 = True
+except ImportError:
+    HAS_PYGIT2 = False
+
+# Import fcntl only on Unix systems
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+# Process groups, and with them start_new_session and pass_fds, are POSIX only.
+# Elsewhere only the server itself is signalled and readiness is polled.
+HAS_PROCESS_GROUPS = hasattr(os, 'killpg')
+
 DISABLE_VSCODE_PLUGIN = os.getenv('DISABLE_VSCODE_PLUGIN', 'false').lower() == 'true'
 
 # Port ranges for the worktree runtime
@@ -55,11 +87,84 @@ VSCODE_PORT_RANGE = (40000, 49999)
 APP_PORT_RANGE_1 = (50000, 54999)
 APP_PORT_RANGE_2 = (55000, 59999)
 
+# Each session starts probing at its own slot inside every range so that
+# runtimes started together do not all contend for the first free port
+PORT_SLOT_COUNT = 50
+PORT_SLOT_WIDTH = 100
+MAX_PORT_ATTEMPTS = 100
+
+# Registry of running sessions, used to skip their ports and to reap the
+# worktrees and servers of sessions whose process died without cleaning up.
+# Sessions closed with keep_runtime_alive are marked persistent and outlive
+# their process until they are deleted.
+REGISTRY_LOCK_FILE = '.registry.lock'
+REGISTRY_FILE = 'registry.json'
+REGISTRY_COLUMNS = ('sids', 'pids', 'server_pids', 'paths', 'ports', 'persistent')
+INIT_LOCK_FILE = '.init.lock'
+
+# The server writes to the READY_FD pipe once it has started. Servers that do
+# not know about it are noticed by polling /alive at this interval instead.
+# The timeout bounds the whole wait, pipe and polling together.
+READY_SIGNAL_TIMEOUT = 120
+READY_FALLBACK_INTERVAL = 2
+
 WORKTREE_NAME_PREFIX = 'openhands-worktree-'
 WORKTREE_BASE_DIR_ENV = 'OPENHANDS_WORKTREE_BASE_DIR'
 
+# Retries for tree entries that are still busy when a worktree is removed
+RMTREE_BUSY_RETRIES = 3
+RMTREE_BUSY_DELAY = 0.05
+
+# Seconds the server, and then whatever it spawned, get to exit after SIGTERM
+SERVER_STOP_TIMEOUT = 5
+CHILD_STOP_TIMEOUT = 1
 
-@dataclass
+# Server output is read from the pipes in chunks of this size
+LOG_READ_SIZE = 65536
+
+# Sparse checkout entries meaning "the whole tree", once slashes are stripped
+FULL_CHECKOUT_PATHS = {'', '*'}
+
+GIT_USER_NAME = 'OpenHands'
+GIT_USER_EMAIL = 'openhands@localhost'
+
+# libgit2 is not safe for concurrent writes to the same repository
+_git_lock = threading.Lock()
+
+
+def _rmtree(path: str) -> None:
+    """Remove a directory tree, retrying entries that are briefly busy.
+
+    A server child that has not exited yet can still hold files open, which
+    makes removal fail with EBUSY; those entries are retried a few times.
+    Other errors are ignored, as with ``ignore_errors=True``.
+    """
+
+    def onexc(func: Callable, failed_path: str, exc: BaseException) -> None:
+        if not (isinstance(exc, OSError) and exc.errno == errno.EBUSY):
+            return
+        for _ in range(RMTREE_BUSY_RETRIES):
+            time.sleep(RMTREE_BUSY_DELAY)
+            try:
+                func(failed_path)
+                return
+            except OSError:
+                pass
+        logger.debug(f'Could not remove busy path {failed_path}')
+
+    shutil.rmtree(path, onexc=onexc)
+
+
+@functools.cache
+def _worktree_base_dir(base_dir_env: str | None) -> str:
+    """Resolve the worktree base directory for a value of the env override."""
+    if base_dir_env:
+        return base_dir_env
+    # Default to a subdirectory in the system temp directory
+    return os.path.join(tempfile.gettempdir(), 'openhands-worktrees')
+
+
+@dataclass(slots=True)
 class ActionExecutionServerInfo:
     """Information about a running server process in a worktree."""
 
@@ -71,6 +176,7 @@ class ActionExecutionServerInfo:
     log_thread_exit_event: threading.Event
     worktree_path: str
     worktree_name: str
+    ready_fd: int | None = None
 
 
 class WorktreeRuntime(ActionExecutionClient):
@@ -96,6 +202,17 @@ class WorktreeRuntime(ActionExecutionClient):
         base_repo_path: The base repository path. Defaults to current working directory.
     """
 
+    # Paths already known to be git repositories, shared by all runtimes
+    _repo_cache: dict[str, bool] = {}
+
+    # Base repositories already initialized by this process
+    _base_repo_checked: set[str] = set()
+    _base_repo_lock = threading.Lock()
+
+    # Orphaned worktrees are reaped once per process, by the first runtime
+    _orphans_reaped = False
+    _reap_lock = threading.Lock()
+
     def __init__(
         self,
         config: OpenHandsConfig,
@@ -119,18 +236,19 @@ class WorktreeRuntime(ActionExecutionClient):
         self.base_repo_path = base_repo_path or os.getcwd()
         self.worktree_path: str | None = None
         self.main_module = main_module
+        self._base_repo: 'pygit2.Repository | None' = None
 
         # Server info
         self._server_info: ActionExecutionServerInfo | None = None
         self._vscode_port = -1
         self._app_ports: list[int] = []
+        self._reserved_sockets: list[socket.socket] = []
 
         # Ensure VSCode plugin is included if not disabled
         if plugins is None:
             plugins = []
-        if not DISABLE_VSCODE_PLUGIN and not any(
-            isinstance(p, VSCodeRequirement) for p in plugins
-        ):
+        plugin_types = {type(p) for p in plugins}
+        if not DISABLE_VSCODE_PLUGIN and VSCodeRequirement not in plugin_types:
             plugins = plugins + [VSCodeRequirement()]
 
         super().__init__(
@@ -147,6 +265,18 @@ class WorktreeRuntime(ActionExecutionClient):
             git_provider_tokens,
         )
 
+        # Environment shared by every server start of this runtime (resume()
+        # included); only ports and paths are added per run
+        self._base_env = {
+            **os.environ,
+            **self.initial_env_vars,
+            'PYTHONUNBUFFERED': '1',
+            'OPENHANDS_SESSION_ID': str(self.sid),
+            'PIP_BREAK_SYSTEM_PACKAGES': '1',
+        }
+        if self.config.debug:
+            self._base_env['DEBUG'] = 'true'
+
     @property
     def action_execution_server_url(self) -> str:
         """Get the URL of the action execution server."""
@@ -154,16 +284,44 @@ class WorktreeRuntime(ActionExecutionClient):
             raise RuntimeError('Server not started')
         return f'http://localhost:{self._server_info.execution_server_port}'
 
+    @property
+    def _repo(self) -> 'pygit2.Repository':
+        """The base repository, opened once and reused for every git operation."""
+        if self._base_repo is None:
+            self._base_repo = pygit2.Repository(self.base_repo_path)
+        return self._base_repo
+
     def _get_worktree_base_dir(self) -> str:
         """Get the base directory for worktrees."""
-        base_dir = os.environ.get(WORKTREE_BASE_DIR_ENV)
-        if base_dir:
-            return base_dir
-        # Default to a subdirectory in the system temp directory
-        return os.path.join(tempfile.gettempdir(), 'openhands-worktrees')
+        return _worktree_base_dir(os.environ.get(WORKTREE_BASE_DIR_ENV))
 
     def _is_git_repository(self, path: str) -> bool:
-        """Check if the given path is a git repository."""
+        """Check if the given path is a git repository.
+
+        Only positive results are cached, so a directory initialized later is
+        picked up on the next call.
+        """
+        if path in self._repo_cache:
+            return True
+
+        # A .git directory, or a .git file pointing at a worktree's gitdir,
+        # settles it without asking git
+        try:
+            mode = os.stat(os.path.join(path, '.git')).st_mode
+        except OSError:
+            mode = 0
+        is_repo = stat.S_ISDIR(mode) or stat.S_ISREG(mode)
+        if not is_repo:
+            is_repo = self._discover_git_repository(path)
+
+        if is_repo:
+            self._repo_cache[path] = True
+        return is_repo
+
+    def _discover_git_repository(self, path: str) -> bool:
+        """Ask git whether the path is inside a repository."""
+        if HAS_PYGIT2:
+            return pygit2.discover_repository(path) is not None
         try:
             result = subprocess.run(
                 ['git', '-C', path, 'rev-parse', '--git-dir'],
@@ -176,92 +334,218 @@ class WorktreeRuntime(ActionExecutionClient):
             return False
 
     def _init_base_repository(self) -> None:
-        """Initialize the base repository if it's not a git repository."""
-        if not self._is_git_repository(self.base_repo_path):
+        """Initialize the base repository if it's not a git repository.
+
+        The check is repeated under a file lock so that runtimes starting
+        together on a fresh workspace initialize it only once.
+        """
+        if self._is_git_repository(self.base_repo_path):
+            return
+
+        init_lock = os.path.join(self._get_worktree_base_dir(), INIT_LOCK_FILE)
+        with self._file_lock(init_lock):
+            if self._is_git_repository(self.base_repo_path):
+                return
+
             logger.info(
                 f'Base path {self.base_repo_path} is not a git repository. Initializing...'
             )
+            if HAS_PYGIT2:
+                self._init_base_repository_pygit2()
+                return
+            # One shell instead of a git process per step
+            script = ' && '.join(
+                [
+                    'git init',
+                    f'git config user.email {shlex.quote(GIT_USER_EMAIL)}',
+                    f'git config user.name {shlex.quote(GIT_USER_NAME)}',
+                    'git add -A',
+                    "git commit -m 'Initial commit' --allow-empty",
+                ]
+            )
             try:
                 subprocess.run(
-                    ['git', 'init'],
-                    cwd=self.base_repo_path,
-                    capture_output=True,
-                    check=True,
-                )
-                subprocess.run(
-                    ['git', 'config', 'user.email', 'openhands@localhost'],
-                    cwd=self.base_repo_path,
-                    capture_output=True,
-                    check=True,
-                )
-                subprocess.run(
-                    ['git', 'config', 'user.name', 'OpenHands'],
+                    ['sh', '-c', script],
                     cwd=self.base_repo_path,
                     capture_output=True,
                     check=True,
                 )
-                # Create an initial commit if there are files
-                subprocess.run(
-                    ['git', 'add', '-A'],
-                    cwd=self.base_repo_path,
-                    capture_output=True,
-                    check=False,
-                )
-                subprocess.run(
-                    ['git', 'commit', '-m', 'Initial commit', '--allow-empty'],
-                    cwd=self.base_repo_path,
-                    capture_output=True,
-                    check=False,
-                )
             except subprocess.CalledProcessError as e:
                 raise AgentRuntimeError(
                     f'Failed to initialize git repository: {e.stderr}'
                 ) from e
 
+    def _init_base_repository_pygit2(self) -> None:
+        """Initialize the base repository in-process with libgit2."""
+        try:
+            with _git_lock:
+                repo = pygit2.init_repository(self.base_repo_path)
+                repo.config['user.email'] = GIT_USER_EMAIL
+                repo.config['user.name'] = GIT_USER_NAME
+                # Create an initial commit of whatever files are already there
+                index = repo.index
+                index.add_all()
+                index.write()
+                signature = pygit2.Signature(GIT_USER_NAME, GIT_USER_EMAIL)
+                repo.create_commit(
+                    'HEAD',
+                    signature,
+                    signature,
+                    'Initial commit',
+                    index.write_tree(),
+                    [],
+                )
+                self._base_repo = repo
+        except pygit2.GitError as e:
+            raise AgentRuntimeError(f'Failed to initialize git repository: {e}') from e
+
+    def _create_worktree_pygit2(self, worktree_path: str) -> None:
+        """Create the worktree in-process with libgit2.
+
+        libgit2 always checks a worktree out on a branch named after it, so a
+        stale branch from an earlier session with the same ID is dropped first
+        to start from the current HEAD, as `git worktree add --detach` would.
+        """
+        try:
+            with _git_lock:
+                repo = self._repo
+                if self.worktree_name in repo.list_worktrees():
+                    repo.lookup_worktree(self.worktree_name).prune(True)
+                branch = repo.branches.local.get(self.worktree_name)
+                if branch is not None:
+                    if branch.is_checked_out():
+                        raise AgentRuntimeError(
+                            f'Branch {self.worktree_name} is checked out elsewhere'
+                        )
+                    branch.delete()
+                repo.add_worktree(self.worktree_name, worktree_path)
+                repo.config['user.email'] = GIT_USER_EMAIL
+                repo.config['user.name'] = GIT_USER_NAME
+        except pygit2.GitError as e:
+            raise AgentRuntimeError(f'Failed to create worktree: {e}') from e
+
+    @staticmethod
+    def _prune_worktree_pygit2(repo: 'pygit2.Repository', worktree_name: str) -> None:
+        """Prune a worktree's git metadata and the branch libgit2 created for it."""
+        with _git_lock:
+            if worktree_name in repo.list_worktrees():
+                repo.lookup_worktree(worktree_name).prune(True)
+            branch = repo.branches.local.get(worktree_name)
+            if branch is not None and not branch.is_checked_out():
+                branch.delete()
+
+    @staticmethod
+    def _get_cone_paths(sparse_paths: list[str]) -> list[str] | None:
+        """Turn ``sandbox.worktree_sparse_paths`` into cone mode directories.
+
+        Cone mode takes directories relative to the repository root, so
+        slashes and a trailing ``/*`` are stripped. Returns None if an entry
+        covers the whole tree (``/*``), meaning no sparse checkout is needed.
+
+        Raises:
+            AgentRuntimeError: If an entry is a pattern rather than a directory.
+        """
+        cone_paths = []
+        for path in sparse_paths:
+            cone_path = path.strip('/')
+            if cone_path.endswith('/*'):
+                cone_path = cone_path[:-2].rstrip('/')
+            if cone_path in FULL_CHECKOUT_PATHS:
+                return None
+            if cone_path.startswith('!') or any(c in cone_path for c in '*?[\\'):
+                raise AgentRuntimeError(
+                    f'Invalid worktree sparse path {path!r}: sparse checkouts '
+                    'take directories, not patterns'
+                )
+            cone_paths.append(cone_path)
+        return cone_paths
+
+    def _create_sparse_worktree(
+        self, worktree_path: str, cone_paths: list[str]
+    ) -> None:
+        """Create the worktree with only the given directories checked out.
+
+        Raises:
+            subprocess.CalledProcessError: If any git step fails.
+        """
+        subprocess.run(
+            ['git', 'worktree', 'add', '--detach', '--no-checkout', worktree_path],
+            cwd=self.base_repo_path,
+            capture_output=True,
+            check=True,
+        )
+        for command in (
+            ['git', 'sparse-checkout', 'init', '--cone'],
+            ['git', 'sparse-checkout', 'set', *cone_paths],
+            ['git', 'checkout'],
+        ):
+            subprocess.run(command, cwd=worktree_path, capture_output=True, check=True)
+
     def _create_worktree(self) -> str:
         """Create a git worktree for this runtime instance.
 
         Returns:
             The path to the created worktree.
         """
-        self._init_base_repository()
+        cone_paths = self._get_cone_paths(self.config.sandbox.worktree_sparse_paths)
+
+        with WorktreeRuntime._base_repo_lock:
+            if self.base_repo_path not in WorktreeRuntime._base_repo_checked:
+                self._init_base_repository()
+                WorktreeRuntime._base_repo_checked.add(self.base_repo_path)
 
         worktree_base = self._get_worktree_base_dir()
-        os.makedirs(worktree_base, exist_ok=True)
+        try:
+            os.mkdir(worktree_base)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            os.makedirs(worktree_base, exist_ok=True)
 
         worktree_path = os.path.join(worktree_base, self.worktree_name)
 
         # Remove existing worktree if it exists
-        if os.path.exists(worktree_path):
+        if os.path.lexists(worktree_path):
             logger.warning(
                 f'Worktree {worktree_path} already exists. Removing...'
             )
-            self._remove_worktree()
+            self._remove_worktree(worktree_path, exists=True)
+
+        # libgit2 has no sparse checkout support, so those go through git
+        if HAS_PYGIT2 and cone_paths is None:
+            self._create_worktree_pygit2(worktree_path)
+            logger.info(f'Created worktree at {worktree_path}')
+            self.worktree_path = worktree_path
+            return worktree_path
 
         try:
             # Create the worktree
-            subprocess.run(
-                ['git', 'worktree', 'add', '--detach', worktree_path],
-                cwd=self.base_repo_path,
-                capture_output=True,
-                check=True,
-            )
+            if cone_paths is not None:
+                self._create_sparse_worktree(worktree_path, cone_paths)
+            else:
+                subprocess.run(
+                    ['git', 'worktree', 'add', '--detach', worktree_path],
+                    cwd=self.base_repo_path,
+                    capture_output=True,
+                    check=True,
+                )
             logger.info(f'Created worktree at {worktree_path}')
 
             # Configure the worktree
             subprocess.run(
-                ['git', 'config', 'user.email', 'openhands@localhost'],
+                ['git', 'config', 'user.email', GIT_USER_EMAIL],
                 cwd=worktree_path,
                 capture_output=True,
                 check=True,
             )
             subprocess.run(
-                ['git', 'config', 'user.name', 'OpenHands'],
+                ['git', 'config', 'user.name', GIT_USER_NAME],
                 cwd=worktree_path,
                 capture_output=True,
                 check=True,
             )
 
+            self.worktree_path = worktree_path
             return worktree_path
 
         except subprocess.CalledProcessError as e:
@@ -269,58 +553,353 @@ class WorktreeRuntime(ActionExecutionClient):
                 f'Failed to create worktree: {e.stderr}'
             ) from e
 
-    def _remove_worktree(self) -> None:
-        """Remove the git worktree for this runtime instance."""
-        if not self.worktree_path or not os.path.exists(self.worktree_path):
+    def _remove_worktree(
+        self, worktree_path: str | None = None, exists: bool | None = None
+    ) -> None:
+        """Remove the git worktree for this runtime instance.
+
+        Args:
+            worktree_path: The worktree to remove. Defaults to ``self.worktree_path``.
+            exists: Whether the path is already known to exist, to skip checking again.
+        """
+        worktree_path = worktree_path or self.worktree_path
+        if not worktree_path:
+            return
+        if exists is None:
+            exists = os.path.lexists(worktree_path)
+        if not exists:
             return
 
         try:
-            # Remove the worktree using git worktree remove
-            subprocess.run(
-                ['git', 'worktree', 'remove', '--force', self.worktree_path],
-                cwd=self.base_repo_path,
-                capture_output=True,
-                check=False,
-            )
+            removed = False
+            if HAS_PYGIT2:
+                # Pruning drops the metadata; the directory is removed below
+                self._prune_worktree_pygit2(self._repo, self.worktree_name)
+            else:
+                # Remove the worktree using git worktree remove
+                result = subprocess.run(
+                    ['git', 'worktree', 'remove', '--force', worktree_path],
+                    cwd=self.base_repo_path,
+                    capture_output=True,
+                    check=False,
+                )
+                removed = result.returncode == 0
 
-            # Clean up any remaining directory
-            if os.path.exists(self.worktree_path):
-                shutil.rmtree(self.worktree_path, ignore_errors=True)
+            # Clean up any remaining directory, unless git already removed it
+            if not removed and os.path.lexists(worktree_path):
+                _rmtree(worktree_path)
 
-            logger.info(f'Removed worktree at {self.worktree_path}')
+            logger.info(f'Removed worktree at {worktree_path}')
 
         except Exception as e:
             logger.warning(f'Error removing worktree: {e}')
 
-    def _find_available_ports(self) -> tuple[int, int, list[int]]:
-        """Find available ports for the server.
+    @staticmethod
+    @contextlib.contextmanager
+    def _file_lock(lock_path: str) -> Iterator[None]:
+        """Hold an exclusive cross-process lock on ``lock_path``.
 
-        Returns:
-            Tuple of (execution_server_port, vscode_port, app_ports).
+        The lock file and its directory are created if needed. Without fcntl
+        the lock is a no-op.
         """
-        execution_port = find_available_tcp_port(
-            EXECUTION_SERVER_PORT_RANGE[0],
-            EXECUTION_SERVER_PORT_RANGE[1],
-        )
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+        try:
+            if HAS_FCNTL:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Closing the descriptor also drops the flock
+            os.close(lock_fd)
+
+    @staticmethod
+    def _read_registry(registry_path: str) -> dict[str, list]:
+        """Load the session registry.
+
+        Sessions are stored as parallel arrays (``sids``, ``pids``,
+        ``server_pids``, ``paths``, ``ports`` and ``persistent``) so liveness
+        can be checked over ``pids`` in one pass. ``pids`` holds the process
+        that owns the runtime, ``server_pids`` its action execution server
+        (None until the server has been spawned). ``persistent`` rows were
+        left running on purpose and are never reaped.
+        """
+        registry: dict[str, list] = {column: [] for column in REGISTRY_COLUMNS}
+        try:
+            with open(registry_path) as f:
+                data = json.load(f)
+            columns = [data[column] for column in REGISTRY_COLUMNS]
+        except (OSError, ValueError, KeyError, TypeError):
+            return registry
+        if len({len(column) for column in columns}) != 1:
+            logger.warning(f'Ignoring malformed worktree registry {registry_path}')
+            return registry
+        return dict(zip(REGISTRY_COLUMNS, columns, strict=True))
+
+    @staticmethod
+    def _write_registry(
+        registry_path: str, registry: dict[str, list], drop: set[int]
+    ) -> None:
+        """Atomically replace the session registry without the rows in ``drop``."""
+        data = {
+            column: [value for i, value in enumerate(values) if i not in drop]
+            for column, values in registry.items()
+        }
+        tmp_path = f'{registry_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, registry_path)
 
-        if self.config.sandbox.vscode_port:
-            vscode_port = self.config.sandbox.vscode_port
-        else:
-            vscode_port = find_available_tcp_port(
-                VSCODE_PORT_RANGE[0],
-                VSCODE_PORT_RANGE[1],
-            )
+    @classmethod
+    def _reap_orphans_once(cls) -> None:
+        """Reap orphaned sessions, the first time any runtime in this process connects."""
+        with cls._reap_lock:
+            if cls._orphans_reaped:
+                return
+            cls._orphans_reaped = True
+            try:
+                cls._reap_orphans()
+            except Exception as e:
+                logger.warning(f'Error reaping orphaned worktrees: {e}')
 
-        app_port_1 = find_available_tcp_port(
-            APP_PORT_RANGE_1[0],
-            APP_PORT_RANGE_1[1],
-        )
-        app_port_2 = find_available_tcp_port(
-            APP_PORT_RANGE_2[0],
-            APP_PORT_RANGE_2[1],
+    @classmethod
+    def _reap_orphans(cls) -> None:
+        """Clean up after runtimes whose process has died.
+
+        Their servers are terminated and their worktrees and caches removed.
+        """
+        base_dir = _worktree_base_dir(os.environ.get(WORKTREE_BASE_DIR_ENV))
+        registry_path = os.path.join(base_dir, REGISTRY_FILE)
+        with cls._file_lock(os.path.join(base_dir, REGISTRY_LOCK_FILE)):
+            registry = cls._read_registry(registry_path)
+            live = set(psutil.pids())
+            dead_idx = [
+                i
+                for i, (pid, persistent) in enumerate(
+                    zip(registry['pids'], registry['persistent'], strict=True)
+                )
+                if pid not in live and not persistent
+            ]
+            if not dead_idx:
+                return
+            for i in dead_idx:
+                worktree_path = registry['paths'][i]
+                cls._terminate_orphan_server(registry['server_pids'][i], worktree_path)
+                if worktree_path and os.path.exists(worktree_path):
+                    logger.info(f'Removing orphaned worktree {worktree_path}')
+                    cls._remove_worktree_at(worktree_path)
+                shutil.rmtree(
+                    os.path.join(base_dir, 'cache', registry['sids'][i]),
+                    ignore_errors=True,
+                )
+            cls._write_registry(registry_path, registry, set(dead_idx))
+
+    @staticmethod
+    def _terminate_orphan_server(pid: int | None, worktree_path: str | None) -> None:
+        """Terminate the server of an orphaned session if it is still running."""
+        if pid is None:
+            return
+        try:
+            process = psutil.Process(pid)
+            # The server runs in its worktree; anything else has reused the pid
+            if worktree_path is None or os.path.realpath(
+                process.cwd()
+            ) != os.path.realpath(worktree_path):
+                return
+            children = process.children(recursive=True)
+            logger.info(f'Terminating orphaned worktree server {pid}')
+            WorktreeRuntime._signal_server_group(pid)
+            WorktreeRuntime._kill_survivors([process, *children], SERVER_STOP_TIMEOUT)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+    @staticmethod
+    def _signal_server_group(pid: int, kill: bool = False) -> None:
+        """Terminate, or kill, a server and everything it spawned.
+
+        The server leads its own session, so its process group id is its pid.
+        Callers only signal while the server has not been reaped, so the group
+        id cannot have been reused. Without process groups only the server
+        itself is signalled.
+        """
+        if HAS_PROCESS_GROUPS:
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                os.killpg(pid, signal.SIGKILL if kill else signal.SIGTERM)
+            return
+        with contextlib.suppress(psutil.NoSuchProcess, psutil.AccessDenied):
+            process = psutil.Process(pid)
+            if kill:
+                process.kill()
+            else:
+                process.terminate()
+
+    @staticmethod
+    def _get_descendants(pid: int) -> list[psutil.Process]:
+        """Get everything a process spawned, or nothing if it is gone."""
+        try:
+            return psutil.Process(pid).children(recursive=True)
+        except psutil.Error:
+            return []
+
+    @staticmethod
+    def _kill_survivors(processes: list[psutil.Process], timeout: float) -> None:
+        """Give processes ``timeout`` seconds to exit, then kill the rest.
+
+        psutil refuses to signal a process whose pid has since been reused.
+        """
+        _, alive = psutil.wait_procs(processes, timeout=timeout)
+        for process in alive:
+            with contextlib.suppress(psutil.NoSuchProcess, psutil.AccessDenied):
+                process.kill()
+
+    @staticmethod
+    def _bind_port(port: int) -> socket.socket | None:
+        """Bind a placeholder socket to the port, or return None if it is taken."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Without SO_REUSEADDR nobody else can bind the port while we hold it
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 0)
+        try:
+            sock.bind(('0.0.0.0', port))
+        except OSError:
+            sock.close()
+            return None
+        return sock
+
+    def _bind_port_in_range(
+        self, port_range: tuple[int, int], excluded: set[int]
+    ) -> socket.socket:
+        """Bind a socket to a free port in the range, starting at this session's slot.
+
+        If the range is exhausted and ``sandbox.strict_port_ranges`` is off,
+        the kernel picks any free port instead.
+        """
+        range_start, range_end = port_range
+        range_size = range_end - range_start + 1
+        offset = (hash(self.sid) % PORT_SLOT_COUNT) * PORT_SLOT_WIDTH
+        for attempt in range(MAX_PORT_ATTEMPTS):
+            port = range_start + (offset + attempt) % range_size
+            if port in excluded:
+                continue
+            sock = self._bind_port(port)
+            if sock is not None:
+                return sock
+
+        if not self.config.sandbox.strict_port_ranges:
+            for _ in range(MAX_PORT_ATTEMPTS):
+                sock = self._bind_port(0)
+                if sock is None:
+                    break
+                if sock.getsockname()[1] not in excluded:
+                    return sock
+                sock.close()
+
+        raise AgentRuntimeError(
+            f'No available port in range {range_start}-{range_end} '
+            f'after {MAX_PORT_ATTEMPTS} attempts'
         )
 
-        return execution_port, vscode_port, [app_port_1, app_port_2]
+    def _reserve_ports_atomic(self) -> tuple[int, int, list[int]]:
+        """Reserve all ports for the server in one step.
+
+        The ports stay bound on ``self._reserved_sockets`` until
+        ``_release_reserved_sockets`` is called right before the server is
+        spawned. The allocation is serialized across processes with a file
+        lock and recorded in a registry under the worktree base directory, so
+        ports belonging to another live runtime are skipped even while its
+        server is not listening.
+
+        Returns:
+            Tuple of (execution_server_port, vscode_port, app_ports).
+        """
+        self._release_reserved_sockets()
+
+        base_dir = self._get_worktree_base_dir()
+        registry_path = os.path.join(base_dir, REGISTRY_FILE)
+        with self._file_lock(os.path.join(base_dir, REGISTRY_LOCK_FILE)):
+            registry = self._read_registry(registry_path)
+            live = set(psutil.pids())
+            own_rows = {i for i, sid in enumerate(registry['sids']) if sid == self.sid}
+            excluded = {
+                port
+                for i, (pid, ports, persistent) in enumerate(
+                    zip(
+                        registry['pids'],
+                        registry['ports'],
+                        registry['persistent'],
+                        strict=True,
+                    )
+                )
+                if (pid in live or persistent) and i not in own_rows
+                for port in ports
+            }
+
+            port_ranges = [
+                EXECUTION_SERVER_PORT_RANGE,
+                APP_PORT_RANGE_1,
+                APP_PORT_RANGE_2,
+            ]
+            if not self.config.sandbox.vscode_port:
+                port_ranges.append(VSCODE_PORT_RANGE)
+
+            try:
+                for port_range in port_ranges:
+                    self._reserved_sockets.append(
+                        self._bind_port_in_range(port_range, excluded)
+                    )
+            except Exception:
+                self._release_reserved_sockets()
+                raise
+
+            ports = [sock.getsockname()[1] for sock in self._reserved_sockets]
+            vscode_port: int = self.config.sandbox.vscode_port or ports[3]
+
+            registry['sids'].append(self.sid)
+            registry['pids'].append(os.getpid())
+            registry['server_pids'].append(None)
+            registry['paths'].append(self.worktree_path)
+            registry['ports'].append(ports)
+            registry['persistent'].append(False)
+            self._write_registry(registry_path, registry, own_rows)
+
+        return ports[0], vscode_port, ports[1:3]
+
+    def _release_reserved_sockets(self) -> None:
+        """Close the placeholder sockets so the server can bind the ports."""
+        for sock in self._reserved_sockets:
+            sock.close()
+        self._reserved_sockets = []
+
+    def _update_registry_row(self, column: str, value: object) -> None:
+        """Set one column of this session's registry row."""
+        base_dir = self._get_worktree_base_dir()
+        registry_path = os.path.join(base_dir, REGISTRY_FILE)
+        try:
+            with self._file_lock(os.path.join(base_dir, REGISTRY_LOCK_FILE)):
+                registry = self._read_registry(registry_path)
+                for i, sid in enumerate(registry['sids']):
+                    if sid == self.sid:
+                        registry[column][i] = value
+                self._write_registry(registry_path, registry, set())
+        except OSError as e:
+            logger.warning(f'Error updating worktree registry: {e}')
+
+    def _unregister_session(self) -> None:
+        """Drop this session's row from the session registry."""
+        self._unregister_sid(self._get_worktree_base_dir(), self.sid)
+
+    @classmethod
+    def _unregister_sid(cls, base_dir: str, sid: str) -> None:
+        """Drop the rows of the given session from the session registry."""
+        registry_path = os.path.join(base_dir, REGISTRY_FILE)
+        try:
+            with cls._file_lock(os.path.join(base_dir, REGISTRY_LOCK_FILE)):
+                registry = cls._read_registry(registry_path)
+                own_rows = {
+                    i for i, row_sid in enumerate(registry['sids']) if row_sid == sid
+                }
+                if own_rows:
+                    cls._write_registry(registry_path, registry, own_rows)
+        except OSError as e:
+            logger.warning(f'Error updating worktree registry: {e}')
 
     def _start_server(self) -> ActionExecutionServerInfo:
         """Start the action execution server in the worktree.
@@ -331,27 +910,33 @@ class WorktreeRuntime(ActionExecutionClient):
         if not self.worktree_path:
             raise RuntimeError('Worktree not created')
 
-        execution_port, vscode_port, app_ports = self._find_available_ports()
-
-        # Prepare environment variables
-        env = os.environ.copy()
-        env.update(self.initial_env_vars)
-        env.update({
+        execution_port, vscode_port, app_ports = self._reserve_ports_atomic()
+
+        # Give each worktree its own caches so parallel builds do not share
+        # (and lock or corrupt) the same cache directories
+        cache_root = self._get_cache_root()
+        cache_env = {
+            'TMPDIR': os.path.join(cache_root, 'tmp'),
+            'PIP_CACHE_DIR': os.path.join(cache_root, 'pip'),
+            'XDG_CACHE_HOME': os.path.join(cache_root, 'xdg'),
+            'npm_config_cache': os.path.join(cache_root, 'npm'),
+            'CARGO_TARGET_DIR': os.path.join(cache_root, 'cargo'),
+        }
+        for cache_dir in cache_env.values():
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # Merge the per-run values into the cached base environment in one
+        # go; runtime startup env vars still take precedence
+        env = {
+            **self._base_env,
             'port': str(execution_port),
-            'PYTHONUNBUFFERED': '1',
             'VSCODE_PORT': str(vscode_port),
             'APP_PORT_1': str(app_ports[0]),
             'APP_PORT_2': str(app_ports[1]),
-            'OPENHANDS_SESSION_ID': str(self.sid),
-            'PIP_BREAK_SYSTEM_PACKAGES': '1',
             'OPENHANDS_WORKTREE_PATH': self.worktree_path,
-        })
-
-        if self.config.debug:
-            env['DEBUG'] = 'true'
-
-        # Add runtime startup env vars
-        env.update(self.config.sandbox.runtime_startup_env_vars)
+            **cache_env,
+            **self.config.sandbox.runtime_startup_env_vars,
+        }
 
         # Get the startup command
         command = self.get_action_execution_server_startup_command()
@@ -359,18 +944,46 @@ class WorktreeRuntime(ActionExecutionClient):
         logger.info(f'Starting server in worktree with command: {command}')
         logger.debug(f'Worktree path: {self.worktree_path}')
 
-        # Start the server process
+        # The pipe is created close-on-exec; pass_fds lets only the server
+        # inherit it. Without pass_fds, readiness is only polled.
+        ready_fd: int | None = None
+        ready_write_fd: int | None = None
+        pass_fds: tuple[int, ...] = ()
+        if HAS_PROCESS_GROUPS:
+            ready_fd, ready_write_fd = os.pipe()
+            env['READY_FD'] = str(ready_write_fd)
+            pass_fds = (ready_write_fd,)
+
+        # Keep the spawn on CPython's vfork() path so the child does not copy
+        # this (large) process's page tables: no preexec_fn, a plain dict env
+        # and an absolute executable. posix_spawn() itself is ruled out by
+        # cwd and pass_fds, but vfork() avoids the same copy. The new session
+        # is set up in the child without a preexec_fn and gives the server its
+        # own process group, so stopping it also stops the tools it spawned.
+        executable = shutil.which(command[0]) or command[0]
+
+        # Start the server process, handing the reserved ports over to it
+        self._release_reserved_sockets()
         try:
             process = subprocess.Popen(
-                command,
+                [executable, *command[1:]],
                 cwd=self.worktree_path,
                 env=env,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
+                close_fds=True,
+                pass_fds=pass_fds,
+                start_new_session=HAS_PROCESS_GROUPS,
             )
         except Exception as e:
+            if ready_fd is not None:
+                os.close(ready_fd)
             raise AgentRuntimeError(f'Failed to start server process: {e}') from e
+        finally:
+            if ready_write_fd is not None:
+                os.close(ready_write_fd)
+
+        self._update_registry_row('server_pids', process.pid)
 
         # Create log thread
         log_exit_event = threading.Event()
@@ -390,45 +1003,84 @@ class WorktreeRuntime(ActionExecutionClient):
             log_thread_exit_event=log_exit_event,
             worktree_path=self.worktree_path,
             worktree_name=self.worktree_name,
+            ready_fd=ready_fd,
         )
 
+    def _get_cache_root(self) -> str:
+        """Get the directory holding this session's tool caches and temp files."""
+        return os.path.join(self._get_worktree_base_dir(), 'cache', self.sid)
+
+    def _get_log_path(self) -> str:
+        """Get the path of the file the server output is written to."""
+        return os.path.join(self._get_worktree_base_dir(), 'logs', f'{self.sid}.log')
+
     def _stream_logs(
         self,
         process: subprocess.Popen,
         exit_event: threading.Event,
     ) -> None:
-        """Stream logs from the server process."""
+        """Stream logs from the server process into the session's log file.
+
+        Both pipes are drained from this one thread with a selector, and each
+        complete line is appended to the log file with its stream prefix.
+        """
         if process.stdout is None or process.stderr is None:
             return
 
-        def read_stream(stream, prefix: str):
-            try:
-                for line in iter(stream.readline, ''):
-                    if exit_event.is_set():
-                        break
-                    if line:
-                        logger.debug(f'[{prefix}] {line.rstrip()}')
-            except Exception as e:
-                logger.debug(f'Log stream error: {e}')
-            finally:
-                stream.close()
-
-        stdout_thread = threading.Thread(
-            target=read_stream,
-            args=(process.stdout, 'SERVER'),
-            daemon=True,
-        )
-        stderr_thread = threading.Thread(
-            target=read_stream,
-            args=(process.stderr, 'SERVER-ERR'),
-            daemon=True,
-        )
-
-        stdout_thread.start()
-        stderr_thread.start()
+        log_path = self._get_log_path()
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+        prefixes = {
+            process.stdout.fileno(): b'[SERVER] ',
+            process.stderr.fileno(): b'[SERVER-ERR] ',
+        }
+        pending = dict.fromkeys(prefixes, b'')
+        # Output is only decoded when it is actually going to be logged
+        debug = self.config.debug and logger.isEnabledFor(logging.DEBUG)
+
+        sel = selectors.DefaultSelector()
+        for fd in prefixes:
+            os.set_blocking(fd, False)
+            sel.register(fd, selectors.EVENT_READ)
+
+        log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+        def write_lines(prefix: bytes, data: bytes) -> None:
+            # data holds whole lines; prefix each one without splitting
+            os.write(log_fd, prefix + data[:-1].replace(b'\n', b'\n' + prefix) + b'\n')
+            if debug:
+                for line in data.splitlines():
+                    logger.debug(
+                        f'{prefix.decode()}{line.decode("utf-8", "replace").rstrip()}'
+                    )
 
-        # Wait for exit event
-        exit_event.wait()
+        try:
+            while sel.get_map() and not exit_event.is_set():
+                for key, _ in sel.select(timeout=0.5):
+                    fd = key.fd
+                    try:
+                        data = os.read(fd, LOG_READ_SIZE)
+                    except BlockingIOError:
+                        continue
+                    if not data:
+                        # EOF: flush any unterminated last line
+                        sel.unregister(fd)
+                        if pending[fd]:
+                            write_lines(prefixes[fd], pending[fd] + b'\n')
+                            pending[fd] = b''
+                        continue
+                    data = pending[fd] + data
+                    end = data.rfind(b'\n') + 1
+                    pending[fd] = data[end:]
+                    if end:
+                        write_lines(prefixes[fd], data[:end])
+        except Exception as e:
+            logger.debug(f'Log stream error: {e}')
+        finally:
+            os.close(log_fd)
+            sel.close()
+            process.stdout.close()
+            process.stderr.close()
 
     def _stop_server(self) -> None:
         """Stop the action execution server."""
@@ -438,19 +1090,29 @@ class WorktreeRuntime(ActionExecutionClient):
         # Signal log thread to exit
         self._server_info.log_thread_exit_event.set()
 
+        if self._server_info.ready_fd is not None:
+            os.close(self._server_info.ready_fd)
+            self._server_info.ready_fd = None
+
         # Terminate the process
         process = self._server_info.process
         if process.poll() is None:
+            # Listed while the server is unreaped, so none of them is stale
+            children = self._get_descendants(process.pid)
             try:
-                process.terminate()
+                self._signal_server_group(process.pid)
                 try:
-                    process.wait(timeout=5)
+                    process.wait(timeout=SERVER_STOP_TIMEOUT)
                 except subprocess.TimeoutExpired:
                     logger.warning('Server process did not terminate, killing...')
-                    process.kill()
+                    self._signal_server_group(process.pid, kill=True)
                     process.wait()
             except Exception as e:
                 logger.warning(f'Error stopping server: {e}')
+            # Don't leave children that ignored SIGTERM behind. The group id
+            # may be reused now that the server is reaped, so they are killed
+            # one by one.
+            self._kill_survivors(children, CHILD_STOP_TIMEOUT)
 
         # Wait for log thread
         self._server_info.log_thread.join(timeout=2)
@@ -462,18 +1124,20 @@ class WorktreeRuntime(ActionExecutionClient):
         """Connect to the runtime by creating the worktree and starting the server."""
         self.set_runtime_status(RuntimeStatus.STARTING_RUNTIME)
 
+        await call_sync_from_async(self._reap_orphans_once)
+
         try:
             # Create the worktree
-            self.worktree_path = self._create_worktree()
+            self.worktree_path = await call_sync_from_async(self._create_worktree)
             logger.info(f'Worktree created at: {self.worktree_path}')
 
             # Start the server
-            self.set_runtime_status(RuntimeStatus.STARTING_RUNTIME)
-            self._server_info = self._start_server()
-
-            logger.info(
-                f'Server started on port {self._server_info.execution_server_port}'
+            server_info: ActionExecutionServerInfo = await call_sync_from_async(
+                self._start_server
             )
+            self._server_info = server_info
+
+            logger.info(f'Server started on port {server_info.execution_server_port}')
 
             # Wait for the server to be ready
             if not self.attach_to_existing:
@@ -481,7 +1145,6 @@ class WorktreeRuntime(ActionExecutionClient):
                     'info',
                     f'Waiting for client to become ready at {self.action_execution_server_url}...',
                 )
-                self.set_runtime_status(RuntimeStatus.STARTING_RUNTIME)
                 await call_sync_from_async(self.wait_until_alive)
                 self.log('info', 'Runtime is ready.')
 
@@ -499,25 +1162,77 @@ class WorktreeRuntime(ActionExecutionClient):
 
             self._runtime_initialized = True
 
-        except Exception as e:
+        except Exception:
             # Cleanup on failure
-            self._stop_server()
-            self._remove_worktree()
+            self._release_reserved_sockets()
+            await call_sync_from_async(self._stop_server)
+            await call_sync_from_async(self._unregister_session)
+            await call_sync_from_async(self._remove_worktree)
+            await call_sync_from_async(
+                shutil.rmtree, self._get_cache_root(), ignore_errors=True
+            )
             raise
 
-    @tenacity.retry(
-        stop=tenacity.stop_after_delay(120) | stop_if_should_exit(),
-        retry=tenacity.retry_if_exception_type(
-            (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout)
-        ),
-        reraise=True,
-        wait=tenacity.wait_fixed(2),
-    )
     def wait_until_alive(self) -> None:
         """Wait until the server is alive and responding."""
         if self._server_info is None:
             raise AgentRuntimeDisconnectedError('Server not started')
 
+        deadline = time.monotonic() + READY_SIGNAL_TIMEOUT
+        if self._server_info.ready_fd is not None:
+            self._wait_for_ready_signal(self._server_info, deadline)
+        self._poll_until_alive(deadline)
+
+    def _wait_for_ready_signal(
+        self, server_info: ActionExecutionServerInfo, deadline: float
+    ) -> None:
+        """Block until the server reports readiness on its READY_FD pipe.
+
+        Returns early on EOF (the server exited) or once /alive answers, which
+        covers servers that never write to the pipe. Either way the caller
+        confirms with _poll_until_alive, within what is left of ``deadline``.
+        """
+        ready_fd = server_info.ready_fd
+        assert ready_fd is not None
+        server_info.ready_fd = None
+        try:
+            with selectors.DefaultSelector() as sel:
+                sel.register(ready_fd, selectors.EVENT_READ)
+                while (remaining := deadline - time.monotonic()) > 0:
+                    if sel.select(timeout=min(READY_FALLBACK_INTERVAL, remaining)):
+                        return
+                    if server_info.process.poll() is not None:
+                        return
+                    try:
+                        self.check_if_alive()
+                        return
+                    except (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout):
+                        pass
+        finally:
+            os.close(ready_fd)
+
+    def _poll_until_alive(self, deadline: float) -> None:
+        """Poll /alive until the server responds, giving up at ``deadline``.
+
+        At least one check is made even if the deadline has already passed.
+        """
+        for attempt in tenacity.Retrying(
+            stop=tenacity.stop_after_delay(max(deadline - time.monotonic(), 0))
+            | stop_if_should_exit(),
+            retry=tenacity.retry_if_exception_type(
+                (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout)
+            ),
+            reraise=True,
+            wait=tenacity.wait_fixed(READY_FALLBACK_INTERVAL),
+        ):
+            with attempt:
+                self._check_server_alive()
+
+    def _check_server_alive(self) -> None:
+        """Check /alive once, failing fast if the server process has exited."""
+        if self._server_info is None:
+            raise AgentRuntimeDisconnectedError('Server not started')
+
         # Check if process is still running
         if self._server_info.process.poll() is not None:
             raise AgentRuntimeDisconnectedError(
@@ -531,10 +1246,14 @@ class WorktreeRuntime(ActionExecutionClient):
         super().close()
 
         if self.config.sandbox.keep_runtime_alive or self.attach_to_existing:
+            # Keep the orphan sweep of later processes away from the session
+            self._update_registry_row('persistent', True)
             return
 
         self._stop_server()
+        self._unregister_session()
         self._remove_worktree()
+        shutil.rmtree(self._get_cache_root(), ignore_errors=True)
 
     def pause(self) -> None:
         """Pause the runtime by stopping the server process."""
@@ -562,41 +1281,67 @@ class WorktreeRuntime(ActionExecutionClient):
         Args:
             conversation_id: The conversation ID (sid) of the runtime to delete.
         """
-        worktree_name = WORKTREE_NAME_PREFIX + conversation_id
-        worktree_base = os.environ.get(
-            WORKTREE_BASE_DIR_ENV,
-            os.path.join(tempfile.gettempdir(), 'openhands-worktrees'),
-        )
-        worktree_path = os.path.join(worktree_base, worktree_name)
+        await call_sync_from_async(cls._delete_session, conversation_id)
+
+    @classmethod
+    def _delete_session(cls, sid: str) -> None:
+        """Remove everything a session left under the worktree base directory.
+
+        That is its worktree, its registry row, its cache directory and its
+        server log.
+        """
+        base_dir = _worktree_base_dir(os.environ.get(WORKTREE_BASE_DIR_ENV))
+        worktree_path = os.path.join(base_dir, WORKTREE_NAME_PREFIX + sid)
 
         if os.path.exists(worktree_path):
-            try:
-                # Try to remove using git worktree remove
-                # Find the base repository
+            cls._remove_worktree_at(worktree_path)
+        cls._unregister_sid(base_dir, sid)
+        shutil.rmtree(os.path.join(base_dir, 'cache', sid), ignore_errors=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(base_dir, 'logs', f'{sid}.log'))
+
+    @classmethod
+    def _remove_worktree_at(cls, worktree_path: str) -> None:
+        """Remove the worktree at the given path and its git metadata."""
+        worktree_name = os.path.basename(worktree_path)
+        try:
+            if HAS_PYGIT2:
+                # The worktree's gitdir is <base>/.git/worktrees/<name>
+                gitdir = pygit2.discover_repository(worktree_path)
+                if gitdir is not None:
+                    worktrees_dir = os.path.dirname(os.path.normpath(gitdir))
+                    if os.path.basename(worktrees_dir) == 'worktrees':
+                        repo = pygit2.Repository(os.path.dirname(worktrees_dir))
+                        cls._prune_worktree_pygit2(repo, worktree_name)
+            else:
+                # Try to remove using git worktree remove, listing the
+                # worktrees of the repository the worktree belongs to
                 result = subprocess.run(
                     ['git', 'worktree', 'list', '--porcelain'],
+                    cwd=worktree_path,
                     capture_output=True,
                     text=True,
                 )
-                for line in result.stdout.split('\n'):
-                    if line.startswith('worktree '):
-                        wt_path = line.split(' ', 1)[1]
-                        if os.path.basename(wt_path) == worktree_name:
-                            subprocess.run(
-                                ['git', 'worktree', 'remove', '--force', wt_path],
-                                capture_output=True,
-                                check=False,
-                            )
-                            break
-
-                # Clean up any remaining directory
-                if os.path.exists(worktree_path):
-                    shutil.rmtree(worktree_path, ignore_errors=True)
-
-                logger.info(f'Deleted worktree: {worktree_path}')
+                # git prints worktree paths with forward slashes on every platform
+                suffix = '/' + worktree_name
+                for line in result.stdout.splitlines():
+                    if line.startswith('worktree ') and line.endswith(suffix):
+                        subprocess.run(
+                            ['git', 'worktree', 'remove', '--force', line[9:]],
+                            cwd=worktree_path,
+                            capture_output=True,
+                            check=False,
+                        )
+                        break
 
-            except Exception as e:
-                logger.warning(f'Error deleting worktree: {e}')
+            # Clean up any remaining directory
+            if os.path.exists(worktree_path):
+                _rmtree(worktree_path)
+
+            logger.info(f'Deleted worktree: {worktree_path}')
+
+        except Exception as e:
+            logger.warning(f'Error deleting worktree: {e}')
 
     @property
     def vscode_url(self) -> str | None:
@@ -0,0 +1,569 @@
+"""Tests for WorktreeSandboxService."""
+
+import asyncio
+import os
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import psutil
+import pytest
+
+from openhands.app_server.errors import SandboxError
+from openhands.app_server.sandbox import worktree_sandbox_service
+from openhands.app_server.sandbox.sandbox_models import AGENT_SERVER, SandboxStatus
+from openhands.app_server.sandbox.worktree_sandbox_service import (
+    WorktreeInfo,
+    WorktreeSandboxService,
+    WorktreeSandboxServiceInjector,
+)
+
+
+class MockSandboxSpec:
+    """Mock sandbox specification."""
+
+    def __init__(self):
+        self.id = 'test-spec'
+        self.initial_env = {'TEST_VAR': 'test_value'}
+        self.plugins = []
+
+
+class MockSandboxSpecService:
+    """Mock sandbox spec service."""
+
+    async def get_default_sandbox_spec(self):
+        return MockSandboxSpec()
+
+    async def get_sandbox_spec(self, spec_id: str):
+        if spec_id == 'test-spec':
+            return MockSandboxSpec()
+        return None
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.fixture(autouse=True)
+def clear_global_state():
+    """Reset the module-level sandbox stores between tests."""
+    yield
+    worktree_sandbox_service._worktrees.clear()
+    worktree_sandbox_service._worktrees_by_api_key.clear()
+    worktree_sandbox_service._process_cache.clear()
+    worktree_sandbox_service._reserved_ports.clear()
+    worktree_sandbox_service._ready_base_repos.clear()
+
+
+@pytest.fixture
+def mock_httpx_client():
+    """Mock httpx client."""
+    client = AsyncMock(spec=httpx.AsyncClient)
+    return client
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield tmpdir
+
+
+@pytest.fixture
+def worktree_sandbox_service_instance(mock_httpx_client, temp_dir):
+    """Create a WorktreeSandboxService instance for testing."""
+    return WorktreeSandboxService(
+        user_id='test-user-id',
+        sandbox_spec_service=MockSandboxSpecService(),
+        base_working_dir=temp_dir,
+        base_repo_path=os.path.join(temp_dir, '.base-repo'),
+        base_port=9000,
+        python_executable='python',
+        httpx_client=mock_httpx_client,
+    )
+
+
+@pytest.fixture
+def started_service(worktree_sandbox_service_instance, temp_dir):
+    """A service whose process start and readiness wait are mocked out.
+
+    The fake server reports the test process's own pid, so status checks see a
+    running process. Cleanup is mocked so deleting never signals it.
+    """
+    service = worktree_sandbox_service_instance
+
+    async def create_worktree(sandbox_id):
+        path = os.path.join(temp_dir, sandbox_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    mock_process = MagicMock()
+    mock_process.pid = os.getpid()
+    with (
+        patch.object(
+            service, '_create_worktree_directory', side_effect=create_worktree
+        ),
+        patch.object(
+            service, '_start_worktree_process', AsyncMock(return_value=mock_process)
+        ),
+        patch.object(service, '_wait_for_worktree_ready', AsyncMock()),
+        patch.object(service, '_ensure_base_repository'),
+        patch.object(service, '_cleanup_worktree_sync', return_value=False),
+    ):
+        yield service
+
+
+def _add_worktree(sandbox_id: str, worktree_path: str, **kwargs) -> WorktreeInfo:
+    """Register a worktree sandbox directly in the global store."""
+    info = WorktreeInfo(
+        pid=kwargs.get('pid', 1234),
+        port=kwargs.get('port', 9000),
+        worktree_path=worktree_path,
+        user_id='test-user-id',
+        session_api_key=kwargs.get('session_api_key', f'{sandbox_id}-key'),
+        created_at=kwargs.get('created_at', datetime.now()),
+        sandbox_spec_id='test-spec',
+        ready=kwargs.get('ready', True),
+    )
+    worktree_sandbox_service._worktrees[sandbox_id] = info
+    worktree_sandbox_service._worktrees_by_api_key[info.session_api_key] = sandbox_id
+    return info
+
+
+class TestWorktreeSandboxService:
+    """Test cases for WorktreeSandboxService."""
+
+    def test_reserve_port(self, worktree_sandbox_service_instance):
+        """Test reserving a port keeps a socket bound to it."""
+        port_socket = worktree_sandbox_service_instance._reserve_port()
+        try:
+            port = port_socket.getsockname()[1]
+            assert port > 0
+            assert port not in worktree_sandbox_service._reserved_ports
+        finally:
+            port_socket.close()
+
+    def test_reserve_port_skips_reserved_ports(self, worktree_sandbox_service_instance):
+        """Test that ports already handed to a sandbox are never reused."""
+        with patch.object(
+            worktree_sandbox_service, '_reserved_ports', MagicMock()
+        ) as mock_reserved:
+            mock_reserved.__contains__.return_value = True
+            with pytest.raises(SandboxError):
+                worktree_sandbox_service_instance._reserve_port()
+            assert (
+                mock_reserved.__contains__.call_count
+                == worktree_sandbox_service._MAX_PORT_ATTEMPTS
+            )
+
+    def test_ensure_base_repository(self, worktree_sandbox_service_instance):
+        """Test that the base repository is created with a commit, once."""
+        service = worktree_sandbox_service_instance
+        service._ensure_base_repository()
+
+        subprocess.run(
+            ['git', 'rev-parse', '--verify', 'HEAD'],
+            cwd=service.base_repo_path,
+            check=True,
+        )
+        with patch.object(worktree_sandbox_service.subprocess, 'run') as run:
+            service._ensure_base_repository()
+        run.assert_not_called()
+
+    def test_ensure_base_repository_repairs_missing_head(
+        self, worktree_sandbox_service_instance
+    ):
+        """Test that a repository left without a commit is repaired."""
+        service = worktree_sandbox_service_instance
+        os.makedirs(service.base_repo_path)
+        subprocess.run(['git', 'init', '-q'], cwd=service.base_repo_path, check=True)
+
+        service._ensure_base_repository()
+
+        subprocess.run(
+            ['git', 'rev-parse', '--verify', 'HEAD'],
+            cwd=service.base_repo_path,
+            check=True,
+        )
+        with open(os.path.join(service.base_repo_path, '.git', 'config')) as f:
+            assert f.read().count('[user]') == 1
+
+    def test_ensure_base_repository_wraps_git_errors(
+        self, worktree_sandbox_service_instance
+    ):
+        """Test that a failed initialization raises SandboxError and is retried."""
+        service = worktree_sandbox_service_instance
+        error = subprocess.CalledProcessError(128, 'git', stderr=b'fatal: boom')
+        with patch.object(
+            worktree_sandbox_service.subprocess, 'run', side_effect=error
+        ):
+            with pytest.raises(SandboxError, match='boom'):
+                service._ensure_base_repository()
+
+        assert service.base_repo_path not in worktree_sandbox_service._ready_base_repos
+
+    @pytest.mark.asyncio
+    async def test_wait_for_server_ready_success(
+        self, worktree_sandbox_service_instance
+    ):
+        """Test waiting for server to be ready - success case."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        worktree_sandbox_service_instance.httpx_client.get.return_value = mock_response
+
+        result = await worktree_sandbox_service_instance._wait_for_server_ready(
+            9000, timeout=1
+        )
+        assert result is True
+
+    @pytest.mark.asyncio
+    async def test_wait_for_server_ready_timeout(
+        self, worktree_sandbox_service_instance
+    ):
+        """Test waiting for server to be ready - timeout case."""
+        worktree_sandbox_service_instance.httpx_client.get.side_effect = Exception(
+            'Connection failed'
+        )
+
+        result = await worktree_sandbox_service_instance._wait_for_server_ready(
+            9000, timeout=1
+        )
+        assert result is False
+
+    def test_get_sandbox_status_missing(self, worktree_sandbox_service_instance):
+        """Test the status of a sandbox without a running process."""
+        status = worktree_sandbox_service_instance._get_sandbox_status('nonexistent')
+        assert status == SandboxStatus.MISSING
+
+    def test_get_sandbox_status_zombie(
+        self, worktree_sandbox_service_instance, temp_dir
+    ):
+        """Test that an exited but unreaped server is not reported as running."""
+        _add_worktree('test-sandbox', temp_dir)
+        mock_process = MagicMock()
+        mock_process.is_running.return_value = True
+        mock_process.status.return_value = psutil.STATUS_ZOMBIE
+        worktree_sandbox_service._process_cache['test-sandbox'] = mock_process
+
+        status = worktree_sandbox_service_instance._get_sandbox_status('test-sandbox')
+        assert status == SandboxStatus.MISSING
+
+    @pytest.mark.parametrize(
+        'ready,expected',
+        [(False, SandboxStatus.STARTING), (True, SandboxStatus.RUNNING)],
+    )
+    def test_get_sandbox_status_running(
+        self, worktree_sandbox_service_instance, temp_dir, ready, expected
+    ):
+        """Test that a live server only counts as running once it is ready."""
+        _add_worktree('test-sandbox', temp_dir, ready=ready)
+        worktree_sandbox_service._process_cache['test-sandbox'] = psutil.Process()
+
+        status = worktree_sandbox_service_instance._get_sandbox_status('test-sandbox')
+        assert status == expected
+
+    @pytest.mark.asyncio
+    async def test_search_sandboxes_empty(self, worktree_sandbox_service_instance):
+        """Test searching sandboxes when none exist."""
+        result = await worktree_sandbox_service_instance.search_sandboxes()
+
+        assert len(result.items) == 0
+        assert result.next_page_id is None
+
+    @pytest.mark.asyncio
+    async def test_search_sandboxes_paginates(
+        self, worktree_sandbox_service_instance, temp_dir
+    ):
+        """Test that search pages through sandboxes newest first."""
+        now = datetime.now()
+        for i in range(3):
+            _add_worktree(f'sandbox-{i}', temp_dir, created_at=now + timedelta(i))
+
+        first = await worktree_sandbox_service_instance.search_sandboxes(limit=2)
+        assert [s.id for s in first.items] == ['sandbox-2', 'sandbox-1']
+        assert first.next_page_id == '2'
+
+        second = await worktree_sandbox_service_instance.search_sandboxes(
+            page_id=first.next_page_id, limit=2
+        )
+        assert [s.id for s in second.items] == ['sandbox-0']
+        assert second.next_page_id is None
+
+    @pytest.mark.asyncio
+    async def test_get_sandbox_not_found(self, worktree_sandbox_service_instance):
+        """Test getting a sandbox that doesn't exist."""
+        result = await worktree_sandbox_service_instance.get_sandbox('nonexistent')
+        assert result is None
+
+    @pytest.mark.asyncio
+    async def test_get_sandbox_by_session_api_key(
+        self, worktree_sandbox_service_instance, temp_dir
+    ):
+        """Test looking a sandbox up by its session API key."""
+        _add_worktree('test-sandbox', temp_dir, session_api_key='test-key')
+
+        result = await worktree_sandbox_service_instance.get_sandbox_by_session_api_key(
+            'test-key'
+        )
+        assert result is not None
+        assert result.id == 'test-sandbox'
+        assert result.created_by_user_id == 'test-user-id'
+        # The server isn't running, so neither the key nor the URLs are exposed
+        assert result.status == SandboxStatus.MISSING
+        assert result.session_api_key is None
+        assert result.exposed_urls is None
+
+        assert (
+            await worktree_sandbox_service_instance.get_sandbox_by_session_api_key(
+                'other-key'
+            )
+            is None
+        )
+
+    @pytest.mark.asyncio
+    async def test_resume_sandbox_not_supported(
+        self, worktree_sandbox_service_instance
+    ):
+        """Test resuming a worktree sandbox."""
+        result = await worktree_sandbox_service_instance.resume_sandbox('nonexistent')
+        assert result is False
+
+    @pytest.mark.asyncio
+    async def test_pause_sandbox_not_supported(self, worktree_sandbox_service_instance):
+        """Test pausing a worktree sandbox."""
+        result = await worktree_sandbox_service_instance.pause_sandbox('nonexistent')
+        assert result is False
+
+    @pytest.mark.asyncio
+    async def test_delete_sandbox_not_found(self, worktree_sandbox_service_instance):
+        """Test deleting a sandbox that doesn't exist."""
+        result = await worktree_sandbox_service_instance.delete_sandbox('nonexistent')
+        assert result is False
+
+    @pytest.mark.asyncio
+    async def test_start_sandbox_with_sandbox_id(self, started_service):
+        """Test starting a sandbox with a specified sandbox_id."""
+        result = await started_service.start_sandbox(sandbox_id='custom_sandbox_id')
+
+        assert result.id == 'custom_sandbox_id'
+        assert result.status == SandboxStatus.RUNNING
+        assert result.sandbox_spec_id == 'test-spec'
+        assert result.created_by_user_id == 'test-user-id'
+        assert result.session_api_key is not None
+        assert result.exposed_urls is not None
+        assert result.exposed_urls[0].name == AGENT_SERVER
+
+        found = await started_service.get_sandbox_by_session_api_key(
+            result.session_api_key
+        )
+        assert found is not None
+        assert found.id == 'custom_sandbox_id'
+
+    @pytest.mark.asyncio
+    async def test_start_sandbox_starting_until_ready(self, started_service):
+        """Test that a sandbox hides its key and URLs while its server starts."""
+        seen = []
+
+        async def wait_for_ready(sandbox_id, process, port):
+            seen.append(await started_service.get_sandbox(sandbox_id))
+            page = await started_service.search_sandboxes()
+            seen.extend(page.items)
+
+        started_service._wait_for_worktree_ready.side_effect = wait_for_ready
+        result = await started_service.start_sandbox(sandbox_id='test-sandbox')
+
+        assert len(seen) == 2
+        for info in seen:
+            assert info.status == SandboxStatus.STARTING
+            assert info.session_api_key is None
+            assert info.exposed_urls is None
+        assert result.status == SandboxStatus.RUNNING
+        sandbox = await started_service.get_sandbox('test-sandbox')
+        assert sandbox is not None
+        assert sandbox.status == SandboxStatus.RUNNING
+
+    @pytest.mark.asyncio
+    async def test_start_sandbox_spec_not_found(self, started_service):
+        """Test starting a sandbox from an unknown spec."""
+        with pytest.raises(SandboxError):
+            await started_service.start_sandbox(sandbox_spec_id='unknown-spec')
+        assert not worktree_sandbox_service._reserved_ports
+
+    @pytest.mark.asyncio
+    async def test_start_sandbox_reserves_port_until_deleted(self, started_service):
+        """Test that a sandbox's port stays reserved for its whole lifetime."""
+        result = await started_service.start_sandbox(sandbox_id='test-sandbox')
+        port = result.exposed_urls[0].port
+
+        assert port in worktree_sandbox_service._reserved_ports
+        assert await started_service.delete_sandbox('test-sandbox') is True
+        assert port not in worktree_sandbox_service._reserved_ports
+        assert await started_service.get_sandbox('test-sandbox') is None
+
+    @pytest.mark.asyncio
+    async def test_start_sandbox_failure_releases_port(self, started_service, temp_dir):
+        """Test that a failed spawn gives back its port, worktree and log."""
+        log_path = started_service._get_log_path('test-sandbox')
+
+        async def fail_to_start(**kwargs):
+            with open(log_path, 'wb') as f:
+                f.write(b'partial output')
+            raise SandboxError('boom')
+
+        started_service._start_worktree_process.side_effect = fail_to_start
+
+        with pytest.raises(SandboxError):
+            await started_service.start_sandbox(sandbox_id='test-sandbox')
+        assert not worktree_sandbox_service._reserved_ports
+        assert 'test-sandbox' not in worktree_sandbox_service._worktrees
+        worktree_path = os.path.join(temp_dir, 'test-sandbox')
+        assert not await asyncio.to_thread(os.path.exists, worktree_path)
+        assert not await asyncio.to_thread(os.path.exists, log_path)
+
+    @pytest.mark.asyncio
+    async def test_start_sandboxes(self, started_service):
+        """Test starting a batch of sandboxes."""
+        results = await started_service.start_sandboxes(
+            [('test-spec', 'sandbox-a'), (None, 'sandbox-b'), (None, 'sandbox-c')]
+        )
+
+        assert [r.id for r in results] == ['sandbox-a', 'sandbox-b', 'sandbox-c']
+        # The shared base repository is initialized once for the whole batch
+        started_service._ensure_base_repository.assert_called_once()
+        ports = {r.exposed_urls[0].port for r in results}
+        assert len(ports) == 3
+        assert ports == worktree_sandbox_service._reserved_ports
+
+    @pytest.mark.asyncio
+    async def test_start_sandboxes_rolls_back_on_failure(self, started_service):
+        """Test that a failed start deletes the sandboxes that did start."""
+        with pytest.raises(SandboxError):
+            await started_service.start_sandboxes(
+                [
+                    (None, 'sandbox-a'),
+                    ('unknown-spec', 'sandbox-b'),
+                    (None, 'sandbox-c'),
+                ]
+            )
+
+        assert not worktree_sandbox_service._worktrees
+        assert not worktree_sandbox_service._worktrees_by_api_key
+        assert not worktree_sandbox_service._reserved_ports
+
+    @pytest.mark.asyncio
+    async def test_get_sandbox_logs(self, worktree_sandbox_service_instance, temp_dir):
+        """Test streaming a sandbox's server log."""
+        _add_worktree('test-sandbox', temp_dir)
+        content = os.urandom(worktree_sandbox_service._FILE_CHUNK_SIZE + 10)
+        log_path = worktree_sandbox_service_instance._get_log_path('test-sandbox')
+        with open(log_path, 'wb') as f:
+            f.write(content)
+
+        chunks = [
+            chunk
+            async for chunk in worktree_sandbox_service_instance.get_sandbox_logs(
+                'test-sandbox'
+            )
+        ]
+        assert [len(chunk) for chunk in chunks] == [
+            worktree_sandbox_service._FILE_CHUNK_SIZE,
+            10,
+        ]
+        assert b''.join(chunks) == content
+
+    @pytest.mark.asyncio
+    async def test_get_sandbox_logs_not_found(self, worktree_sandbox_service_instance):
+        """Test streaming logs for a sandbox that doesn't exist."""
+        with pytest.raises(SandboxError):
+            async for _ in worktree_sandbox_service_instance.get_sandbox_logs(
+                'nonexistent'
+            ):
+                pass
+
+    def test_read_log_tail(self, worktree_sandbox_service_instance):
+        """Test that only the end of a long log is read for error reports."""
+        log_path = worktree_sandbox_service_instance._get_log_path('test-sandbox')
+        with open(log_path, 'wb') as f:
+            f.write(b'x' * worktree_sandbox_service._LOG_TAIL_SIZE + b'the end')
+
+        tail = worktree_sandbox_service_instance._read_log_tail('test-sandbox')
+        assert len(tail) == worktree_sandbox_service._LOG_TAIL_SIZE
+        assert tail.endswith(b'the end')
+
+    @pytest.mark.asyncio
+    async def test_read_file_stream(self, worktree_sandbox_service_instance, temp_dir):
+        """Test reading a sandbox file in fixed-size chunks."""
+        _add_worktree('test-sandbox', temp_dir)
+        with open(os.path.join(temp_dir, 'file.txt'), 'wb') as f:
+            f.write(b'0123456789')
+
+        chunks = [
+            chunk
+            async for chunk in worktree_sandbox_service_instance.read_file_stream(
+                'test-sandbox', 'file.txt', chunk_size=4
+            )
+        ]
+        assert chunks == [b'0123', b'4567', b'89']
+        assert (
+            await worktree_sandbox_service_instance.read_file(
+                'test-sandbox', 'file.txt'
+            )
+            == b'0123456789'
+        )
+
+    @pytest.mark.asyncio
+    async def test_read_file_not_found(self, worktree_sandbox_service_instance):
+        """Test reading a file from a sandbox that doesn't exist."""
+        with pytest.raises(SandboxError):
+            await worktree_sandbox_service_instance.read_file('nonexistent', 'file')
+
+    @pytest.mark.asyncio
+    async def test_write_file(self, worktree_sandbox_service_instance, temp_dir):
+        """Test writing a whole file into a new directory of a sandbox."""
+        _add_worktree('test-sandbox', temp_dir)
+
+        await worktree_sandbox_service_instance.write_file(
+            'test-sandbox', 'sub/dir/file.txt', b'content'
+        )
+
+        with open(os.path.join(temp_dir, 'sub', 'dir', 'file.txt'), 'rb') as f:
+            assert f.read() == b'content'
+
+    @pytest.mark.asyncio
+    async def test_write_file_chunks(self, worktree_sandbox_service_instance, temp_dir):
+        """Test writing a file from an async iterable of chunks."""
+        _add_worktree('test-sandbox', temp_dir)
+
+        await worktree_sandbox_service_instance.write_file(
+            'test-sandbox', 'file.txt', _chunks(b'first ', b'second ', b'third')
+        )
+
+        with open(os.path.join(temp_dir, 'file.txt'), 'rb') as f:
+            assert f.read() == b'first second third'
+
+
+class TestWorktreeSandboxServiceInjector:
+    """Test cases for WorktreeSandboxServiceInjector."""
+
+    def test_default_values(self):
+        """Test default configuration values."""
+        injector = WorktreeSandboxServiceInjector()
+
+        assert injector.base_working_dir == '/tmp/openhands-worktrees'
+        assert injector.base_repo_path is None
+        assert injector.python_executable == 'python'
+
+    def test_custom_values(self):
+        """Test custom configuration values."""
+        injector = WorktreeSandboxServiceInjector(
+            base_working_dir='/custom/path',
+            base_repo_path='/custom/repo',
+            python_executable='python3',
+        )
+
+        assert injector.base_working_dir == '/custom/path'
+        assert injector.base_repo_path == '/custom/repo'
+        assert injector.python_executable == 'python3'